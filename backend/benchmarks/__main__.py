@@ -0,0 +1,206 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Benchmarks for the analysis and outfit hot paths. Run from backend/, after
+# `pip install -r requirements-bench.txt` (the macro benchmarks need httpx):
+#
+#   python -m benchmarks record                         re-record the FaceMesh fixture (needs MediaPipe)
+#   python -m benchmarks run                            micro + macro, FaceMesh stubbed, results/<time>.json
+#   python -m benchmarks run --face-mesh real --executor thread --compare reference
+#   python -m benchmarks run --save-baseline reference  store a run as baselines/reference.json
+#   python -m benchmarks compare reference results/<time>.json --threshold 0.1
+#
+# `run --compare` and `compare` exit with status 1 when a benchmark got slower than the
+# threshold (or a macro run has more failed requests). Baselines are machine-specific: compare
+# runs taken on the same hardware. Load tests against a running server: benchmarks/loadgen.py.
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("record", help="record FaceMesh landmarks and the decoded pixels of the fixture face")
+
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("--only", choices=("micro", "macro"), help="run one group only")
+    run.add_argument("--face-mesh", choices=("stub", "real"), default="stub",
+                     help="stub answers with the recorded landmarks; real runs MediaPipe")
+    run.add_argument("--executor", choices=("inline", "thread", "process"), default="inline",
+                     help="ANALYSIS_EXECUTOR for the macro runs (process needs --face-mesh real)")
+    run.add_argument("--caches", action="store_true",
+                     help="keep the result / landmark / palette caches on (off by default so every "
+                          "request does the full work)")
+    run.add_argument("--min-time", type=float, default=0.5, help="seconds of samples per micro benchmark")
+    run.add_argument("--requests", type=int, default=64,
+                     help="/analyze requests per concurrency level (/api/outfits sends 4x as many)")
+    run.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    run.add_argument("--upload-side", type=int, default=1200, help="longest side of the /analyze upload")
+    run.add_argument("--output", help="results file (default benchmarks/results/<timestamp>.json)")
+    run.add_argument("--save-baseline", metavar="NAME", help="also store the results as baselines/NAME.json")
+    run.add_argument("--compare", metavar="BASELINE", help="compare against a baseline name or results file")
+    run.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before flagging (0.15 = 15%%)")
+
+    compare = commands.add_parser("compare", help="compare two results files")
+    compare.add_argument("baseline", help="baseline name (benchmarks/baselines/<name>.json) or path")
+    compare.add_argument("current", help="results file")
+    compare.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown before flagging")
+    compare.add_argument("--metric", default="median_ms", help="statistic to compare (median_ms, p95_ms, ...)")
+    return parser.parse_args(argv)
+
+
+def import_app(executor="inline", caches=False):
+    # The app reads its settings at import, so the benchmark configuration goes into the
+    # environment first. Models are loaded explicitly, before any timing.
+    os.environ["MODEL_INIT"] = "lazy"
+    os.environ["ANALYSIS_EXECUTOR"] = executor
+    if not caches:
+        os.environ["RESULT_CACHE_ENABLED"] = "0"
+        os.environ["LANDMARK_CACHE_ENABLED"] = "0"
+        os.environ["PALETTE_CACHE_SIZE"] = "0"
+
+    import main
+
+    # Per-request INFO logs would dominate the console (and the timings of the cheap stages)
+    logging.getLogger().setLevel(logging.WARNING)
+    return main
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_meta(args):
+    import numpy as np
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "face_mesh": args.face_mesh,
+        "executor": args.executor,
+        "caches": args.caches,
+        "upload_side": args.upload_side,
+    }
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def command_record():
+    from benchmarks import fixtures
+
+    main = import_app()
+    landmarks, sample_rgb = fixtures.record(main)
+    print(f"Recorded {len(landmarks)} landmarks and a {sample_rgb.shape} pixel buffer to {fixtures.RECORDED_PATH}")
+    return 0
+
+
+def command_run(args):
+    from benchmarks import compare, fixtures, suite
+
+    if args.executor == "process" and args.face_mesh == "stub":
+        print("--executor process runs FaceMesh in spawned workers, which the stub cannot reach; use --face-mesh real")
+        return 2
+
+    if args.only in (None, "macro"):
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            print("The macro benchmarks need httpx: pip install -r requirements-bench.txt (or use --only micro)")
+            return 2
+
+    landmarks, sample_rgb = fixtures.load_recorded()
+    main = import_app(args.executor, args.caches)
+    if args.face_mesh == "stub":
+        fixtures.install_stub(main, landmarks)
+
+    print("Loading models...")
+    failed = suite.load_app_models(main)
+    if failed:
+        print(f"Warning: failed to load {', '.join(failed)}; their fallbacks are benchmarked instead")
+
+    upload_data = fixtures.uploads()
+    if args.upload_side not in upload_data:
+        upload_data[args.upload_side] = fixtures.upload_bytes(args.upload_side)
+
+    results = {}
+    try:
+        if args.only in (None, "micro"):
+            print("Micro benchmarks")
+            micro_uploads = {side: upload_data[side] for side in fixtures.UPLOAD_SIDES}
+            results.update(suite.run_micro(main, landmarks, sample_rgb, micro_uploads, args.min_time))
+        if args.only in (None, "macro"):
+            print(f"Macro benchmarks (executor {args.executor}, {args.upload_side}px uploads)")
+            levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+            results.update(suite.run_macro(
+                main, landmarks, sample_rgb, upload_data, args.upload_side, args.requests, levels
+            ))
+    finally:
+        main.analysis_executor.shutdown()
+
+    report = {"meta": run_meta(args), "results": results}
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    write_json(output, report)
+    print(f"Results written to {output}")
+    if args.save_baseline:
+        path = compare.baseline_path(args.save_baseline)
+        write_json(path, report)
+        print(f"Baseline saved to {path}")
+
+    if args.compare:
+        return report_comparison(compare.load_results(compare.baseline_path(args.compare)), report, args.threshold)
+    return 0
+
+
+def report_comparison(baseline, current, threshold, metric="median_ms"):
+    from benchmarks import compare
+
+    for key, before, after in compare.config_differences(baseline, current):
+        print(f"Warning: runs differ in {key} (baseline {before}, current {after})")
+
+    rows = compare.compare(baseline, current, threshold, metric)
+    print(compare.format_rows(rows, metric))
+    slower = compare.regressions(rows)
+    if slower:
+        print(f"{len(slower)} benchmark(s) regressed by more than {threshold * 100:.0f}%")
+        return 1
+    print(f"No regressions beyond {threshold * 100:.0f}%")
+    return 0
+
+
+def cli(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command == "record":
+        return command_record()
+    if args.command == "run":
+        return command_run(args)
+
+    from benchmarks import compare
+
+    baseline = compare.load_results(compare.baseline_path(args.baseline))
+    current = compare.load_results(args.current)
+    return report_comparison(baseline, current, args.threshold, args.metric)
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,67 @@
+import json
+import os
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+def baseline_path(name):
+    # A stored baseline by name (benchmarks/baselines/<name>.json), or any results file path
+    if os.path.exists(name) or name.endswith(".json"):
+        return name
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Run settings that change what is measured; comparing runs that differ in them is meaningless
+CONFIG_KEYS = ("face_mesh", "executor", "caches", "upload_side", "cpu_count", "machine")
+
+
+def config_differences(baseline, current):
+    before = baseline.get("meta", {})
+    after = current.get("meta", {})
+    return [(key, before.get(key), after.get(key)) for key in CONFIG_KEYS if before.get(key) != after.get(key)]
+
+
+def compare(baseline, current, threshold=0.15, metric="median_ms"):
+    # One row per benchmark present in either run: (name, baseline, current, change, status).
+    # `change` is current / baseline - 1; anything slower than 1 + threshold is a regression.
+    base_results = baseline.get("results", {})
+    current_results = current.get("results", {})
+    rows = []
+    for name in sorted(set(base_results) | set(current_results)):
+        before = base_results.get(name, {}).get(metric)
+        after = current_results.get(name, {}).get(metric)
+        if before is None or after is None:
+            rows.append((name, before, after, None, "missing"))
+            continue
+
+        change = after / before - 1 if before > 0 else 0.0
+        if change > threshold:
+            status = "REGRESSION"
+        elif change < -threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        # Failed requests make a macro run incomparable whatever its latency
+        if current_results[name].get("errors", 0) > base_results[name].get("errors", 0):
+            status = "REGRESSION"
+        rows.append((name, before, after, change, status))
+    return rows
+
+
+def format_rows(rows, metric="median_ms"):
+    lines = [f"{'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>9}  status  ({metric})"]
+    for name, before, after, change, status in rows:
+        before_text = "-" if before is None else f"{before:.3f}"
+        after_text = "-" if after is None else f"{after:.3f}"
+        change_text = "" if change is None else f"{change * 100:+.1f}%"
+        lines.append(f"{name:<40} {before_text:>12} {after_text:>12} {change_text:>9}  {status}")
+    return "\n".join(lines)
+
+
+def regressions(rows):
+    return [row for row in rows if row[4] == "REGRESSION"]
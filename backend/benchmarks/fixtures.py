@@ -0,0 +1,94 @@
+import hashlib
+import io
+import os
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+# Offline inputs for the benchmarks. FaceMesh output and the decoded pixel buffer of the
+# bundled warm-up face are recorded once (`python -m benchmarks record`), so every stage after
+# detection - and FaceMesh itself, when stubbed - runs without MediaPipe.
+
+FACE_IMAGE_PATH = "fixtures/warmup_face.jpg"
+RECORDED_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "face_landmarks.npz")
+
+# Upload sizes (longest side, px) exercised by the decode and /analyze benchmarks. Larger
+# ones are upscaled re-encodes of the face, so JPEG draft decoding and resizing get exercised.
+UPLOAD_SIDES = (300, 1200, 2400)
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def upload_bytes(side, path=FACE_IMAGE_PATH):
+    # JPEG bytes of the face with its longest side scaled to `side`
+    with open(path, "rb") as f:
+        data = f.read()
+    image = Image.open(io.BytesIO(data))
+    if max(image.size) == side:
+        return data
+
+    scale = side / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    out = io.BytesIO()
+    image.convert("RGB").resize(size, Image.LANCZOS).save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def uploads():
+    return {side: upload_bytes(side) for side in UPLOAD_SIDES}
+
+# =========================
+# RECORDED FACE
+# =========================
+def record(main):
+    # Runs the real decode + FaceMesh on the face image and stores the results
+    with open(FACE_IMAGE_PATH, "rb") as f:
+        detect_rgb, sample_rgb = main.decode_image(f.read())
+    landmarks = main.detect_landmarks(detect_rgb)
+    if landmarks is None:
+        raise RuntimeError(f"No face detected in {FACE_IMAGE_PATH}")
+
+    os.makedirs(os.path.dirname(RECORDED_PATH), exist_ok=True)
+    np.savez_compressed(
+        RECORDED_PATH,
+        landmarks=landmarks,
+        sample_rgb=sample_rgb,
+        source_sha256=np.array(file_sha256(FACE_IMAGE_PATH)),
+    )
+    return landmarks, sample_rgb
+
+
+def load_recorded():
+    # (landmarks, sample_rgb) recorded from the face image
+    if not os.path.exists(RECORDED_PATH):
+        raise FileNotFoundError(f"{RECORDED_PATH} is missing, run `python -m benchmarks record`")
+    with np.load(RECORDED_PATH) as data:
+        if str(data["source_sha256"]) != file_sha256(FACE_IMAGE_PATH):
+            raise ValueError(f"{FACE_IMAGE_PATH} changed since it was recorded, run `python -m benchmarks record`")
+        return data["landmarks"], data["sample_rgb"]
+
+# =========================
+# FACEMESH STUB
+# =========================
+class StubFaceMesh:
+    # Answers every process() call with the recorded landmarks, in MediaPipe's result shape.
+    # Landmarks are normalized, so they fit the detection buffer of any upload size.
+    def __init__(self, landmarks):
+        points = [SimpleNamespace(x=float(x), y=float(y), z=0.0) for x, y in landmarks]
+        self._results = SimpleNamespace(multi_face_landmarks=[SimpleNamespace(landmark=points)])
+
+    def process(self, rgb_image):
+        return self._results
+
+    def close(self):
+        pass
+
+
+def install_stub(main, landmarks):
+    # Swaps the FaceMesh factory of the app's pool (drops graphs created so far)
+    main.face_mesh_pool.reset()
+    main.face_mesh_pool.factory = lambda: StubFaceMesh(landmarks)
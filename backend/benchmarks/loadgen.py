@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+# Open-loop load generator for a running backend (uvicorn or gunicorn), used to size instances
+# and compare worker counts / executor modes. Requests are sent on a Poisson schedule at each
+# rate in --rates, whether or not earlier ones have finished, and latency is measured from the
+# scheduled send time, so a backed-up server shows up as latency instead of a lower send rate.
+# Run from backend/, after `pip install -r requirements-bench.txt` (adds httpx):
+#
+#   gunicorn -c gunicorn.conf.py main:app &
+#   python -m benchmarks.loadgen --url http://localhost:10000 --rates 2,5,10 --duration 30 \
+#       --label "2 workers, thread executor"
+#
+# Reports p50/p95/p99 latency, throughput and errors per rate and endpoint, and saves the run
+# (with the server's /stats before and after) to benchmarks/results/load-<timestamp>.json.
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+EVENTS = ("Casual brunch", "Work meeting", "Office", "Night party", "Club", "Wedding", "Gala", "Street", "Gym")
+SEASONS = ("Summer", "Winter", "Spring", "Monsoon", "Autumn")
+# dark_score ranges of the three skin tones (see analyze_face_image's fallback rules)
+DARK_SCORES = {"light": (0.5, 4.0), "dusky": (4.0, 8.5), "dark": (8.5, 10.0)}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadgen")
+    parser.add_argument("--url", default="http://localhost:10000", help="backend base URL")
+    parser.add_argument("--rates", default="2,5,10", help="comma-separated arrival rates (requests/s), run in order")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per rate")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unrecorded load before the first rate")
+    parser.add_argument("--mix", default="analyze=1,outfits=3",
+                        help="relative weights of /analyze and /api/outfits requests")
+    parser.add_argument("--images", help="directory of face images to upload (default: the bundled fixture face "
+                                         "at several sizes)")
+    parser.add_argument("--allow-cache-hits", action="store_true",
+                        help="upload identical bytes (by default each upload gets random trailing bytes so "
+                             "the server's result and landmark caches miss)")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=256,
+                        help="requests due while this many are outstanding are dropped and counted")
+    parser.add_argument("--label", default="", help="free-form description of the server setup")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-wait-ready", action="store_true", help="do not wait for /ready before starting")
+    parser.add_argument("--output", help="report file (default benchmarks/results/load-<timestamp>.json)")
+    return parser.parse_args(argv)
+
+# =========================
+# PAYLOADS
+# =========================
+def load_uploads(directory=None):
+    # [(filename, bytes, content type)]
+    if directory is None:
+        from benchmarks.fixtures import uploads
+
+        return [(f"face_{side}.jpg", data, "image/jpeg") for side, data in uploads().items()]
+
+    files = []
+    for pattern in ("*.jpg", "*.jpeg", "*.png", "*.webp"):
+        files.extend(glob.glob(os.path.join(directory, pattern)))
+    if not files:
+        raise FileNotFoundError(f"No images found in {directory}")
+    content_types = {".png": "image/png", ".webp": "image/webp"}
+    uploads = []
+    for path in sorted(files):
+        with open(path, "rb") as f:
+            uploads.append((os.path.basename(path), f.read(), content_types.get(os.path.splitext(path)[1].lower(), "image/jpeg")))
+    return uploads
+
+
+def outfit_payloads(rng, count=200):
+    # OutfitRequest bodies like the frontend sends after an analysis: a subtype's recommended
+    # colors (with match scores), a matching dark_score and undertone, random event and season
+    from color_maps import seasonal_recommended_colors
+
+    payloads = []
+    subtypes = sorted(seasonal_recommended_colors)
+    for _ in range(count):
+        subtype = rng.choice(subtypes)
+        tone, undertone = (subtype.split() + ["Neutral"])[:2]
+        colors = seasonal_recommended_colors[subtype]
+        chosen = rng.sample(colors, min(len(colors), rng.randint(8, 20)))
+        low, high = DARK_SCORES.get(tone.lower(), (0.5, 10.0))
+        payloads.append({
+            "dark_score": round(rng.uniform(low, high), 2),
+            "undertone": undertone,
+            "preferred_color": rng.choice(["", "", rng.choice(chosen)["family"]]),
+            "event": rng.choice(EVENTS),
+            "season": rng.choice(SEASONS),
+            "gender": rng.choice(["female", "male"]),
+            "recommended_colors": [
+                {**c, "match_score": round(rng.uniform(60, 100), 1)} for c in chosen
+            ],
+        })
+    return payloads
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"analyze", "outfits"}
+    if unknown:
+        raise ValueError(f"Unknown endpoint(s) in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+# =========================
+# LOAD
+# =========================
+class LoadRun:
+    def __init__(self, client, args, uploads, payloads, rng):
+        self.client = client
+        self.args = args
+        self.uploads = uploads
+        self.payloads = payloads
+        self.rng = rng
+        mix = parse_mix(args.mix)
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.in_flight = 0
+
+    def build_request(self):
+        endpoint = self.rng.choices(self.endpoints, self.weights)[0]
+        if endpoint == "analyze":
+            filename, data, content_type = self.rng.choice(self.uploads)
+            if not self.args.allow_cache_hits:
+                # Decoders ignore bytes after the end of the image; the upload hash changes
+                data = data + self.rng.randbytes(16)
+            gender = self.rng.choice(["female", "male"])
+            return endpoint, dict(
+                method="POST", url=f"/analyze?gender={gender}",
+                files={"image": (filename, data, content_type)},
+            )
+        return endpoint, dict(method="POST", url="/api/outfits", json=self.rng.choice(self.payloads))
+
+    async def send(self, endpoint, request, scheduled, records):
+        self.in_flight += 1
+        status = None
+        try:
+            response = await self.client.request(**request)
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        finally:
+            self.in_flight -= 1
+        records.append((endpoint, status, time.perf_counter() - scheduled))
+
+    async def run_rate(self, rate, duration):
+        # Returns ([(endpoint, status, latency)], dropped per endpoint, wall seconds)
+        records, tasks, dropped = [], [], {}
+        start = time.perf_counter()
+        scheduled = start
+        while True:
+            scheduled += self.rng.expovariate(rate)
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            endpoint, request = self.build_request()
+            if self.in_flight >= self.args.max_in_flight:
+                dropped[endpoint] = dropped.get(endpoint, 0) + 1
+                continue
+            tasks.append(asyncio.ensure_future(self.send(endpoint, request, scheduled, records)))
+
+        # Requests still outstanding finish (or time out) before the step is reported
+        if tasks:
+            await asyncio.gather(*tasks)
+        return records, dropped, time.perf_counter() - start
+
+
+def summarize_step(rate, duration, records, dropped, wall):
+    from benchmarks.suite import summarize
+
+    step = {"rate": rate, "duration": duration, "wall_seconds": round(wall, 2), "endpoints": {}}
+    for endpoint in sorted({r[0] for r in records} | set(dropped)):
+        rows = [r for r in records if r[0] == endpoint]
+        ok = [latency for _, status, latency in rows if status == 200]
+        errors = {}
+        for _, status, _ in rows:
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+        stats = {
+            "sent": len(rows),
+            "ok": len(ok),
+            "dropped": dropped.get(endpoint, 0),
+            "errors": errors,
+            "error_rate": round((len(rows) - len(ok)) / len(rows), 4) if rows else 0.0,
+            "throughput_rps": round(len(ok) / duration, 2),
+        }
+        if ok:
+            stats.update(summarize(ok))
+        step["endpoints"][endpoint] = stats
+    return step
+
+
+def print_step(step):
+    print(f"rate {step['rate']:g} req/s for {step['duration']:g}s (wall {step['wall_seconds']:.1f}s)")
+    for endpoint, s in step["endpoints"].items():
+        latency = (
+            f"p50 {s['median_ms']:8.1f}  p95 {s['p95_ms']:8.1f}  p99 {s['p99_ms']:8.1f} ms"
+            if s["ok"] else "no successful requests"
+        )
+        errors = ", ".join(f"{k}: {v}" for k, v in s["errors"].items()) or "none"
+        print(
+            f"  {endpoint:<8} sent {s['sent']:5d}  ok {s['ok']:5d}  {s['throughput_rps']:7.2f} req/s  "
+            f"{latency}  errors {errors}  dropped {s['dropped']}"
+        )
+
+
+async def fetch_json(client, path):
+    try:
+        response = await client.get(path)
+        return response.json()
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+async def wait_ready(client, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return True
+        except Exception:
+            pass
+        await asyncio.sleep(1)
+    return False
+
+
+async def run(args):
+    try:
+        import httpx
+    except ImportError:
+        print("The load generator needs httpx: pip install -r requirements-bench.txt")
+        return 2
+
+    rng = random.Random(args.seed)
+    uploads = load_uploads(args.images)
+    payloads = outfit_payloads(rng)
+    rates = [float(r) for r in args.rates.split(",") if r.strip()]
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        if not args.no_wait_ready:
+            print(f"Waiting for {args.url}/ready ...")
+            if not await wait_ready(client):
+                print("Server did not become ready")
+                return 1
+
+        load = LoadRun(client, args, uploads, payloads, rng)
+        if args.warmup > 0:
+            print(f"Warming up for {args.warmup:g}s at {rates[0]:g} req/s")
+            await load.run_rate(rates[0], args.warmup)
+
+        stats_before = await fetch_json(client, "/stats")
+        steps = []
+        for rate in rates:
+            records, dropped, wall = await load.run_rate(rate, args.duration)
+            step = summarize_step(rate, args.duration, records, dropped, wall)
+            print_step(step)
+            steps.append(step)
+        stats_after = await fetch_json(client, "/stats")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "url": args.url,
+            "label": args.label,
+            "mix": args.mix,
+            "duration": args.duration,
+            "uploads": [name for name, _, _ in uploads],
+            "cache_busting": not args.allow_cache_hits,
+            "seed": args.seed,
+        },
+        "steps": steps,
+        "server_stats": {"before": stats_before, "after": stats_after},
+    }
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("load-%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"Report written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args(sys.argv[1:]))))
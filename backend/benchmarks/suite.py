@@ -0,0 +1,199 @@
+import asyncio
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import UPLOAD_SIDES
+
+# Micro benchmarks time one pipeline stage at a time on fixed inputs; macro benchmarks drive
+# /analyze and /api/outfits in-process through the ASGI app at several concurrency levels.
+# Every result is a latency summary in milliseconds (plus throughput for macro runs).
+
+# =========================
+# TIMING
+# =========================
+def summarize(seconds):
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "n": int(len(ms)),
+        "min_ms": round(float(ms.min()), 4),
+        "median_ms": round(float(np.median(ms)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def measure(fn, min_time=0.5, min_samples=5, max_samples=5000, warmup=3):
+    # Calls fn until min_time seconds of samples (at least min_samples) are collected
+    for _ in range(warmup):
+        fn()
+    samples = []
+    total = 0.0
+    while (total < min_time or len(samples) < min_samples) and len(samples) < max_samples:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        total += elapsed
+    return summarize(samples)
+
+# =========================
+# MICRO
+# =========================
+def outfit_request(analysis, gender="female", event="work", season="summer"):
+    from outfit_router import OutfitRequest
+
+    return OutfitRequest(
+        dark_score=analysis["dark_score"],
+        undertone=analysis["undertone"],
+        event=event,
+        season=season,
+        gender=gender,
+        recommended_colors=analysis["recommended_colors"],
+    )
+
+
+def micro_benchmarks(main, landmarks, sample_rgb, upload_data):
+    # name -> zero-argument callable, in pipeline order
+    import settings
+    from palette import get_palette
+    from selection import select_palette
+    from skin_sampling import calculate_brightness, sample_line_pairs, sample_region_mask, split_light_dark
+
+    gender = "female"
+    detect_rgb, _ = main.decode_image(upload_data[UPLOAD_SIDES[0]])
+    pixels = sample_line_pairs(
+        sample_rgb, landmarks, gender=gender,
+        density=settings.SAMPLE_DENSITY, mode=settings.SAMPLE_MODE, patch=settings.SAMPLE_PATCH,
+    )
+    light, dark = split_light_dark(pixels)
+    r, g, b = np.concatenate([light, dark]).mean(axis=0)
+    dark_score = len(dark) / (len(light) + len(dark)) * 10
+    skin_features = [float(r), float(g), float(b), calculate_brightness(r, g, b), dark_score]
+    features = np.array([skin_features], dtype=np.float32)
+
+    analysis, _ = main.analyze_face_image(sample_rgb, gender=gender, landmarks=landmarks)
+    palette = get_palette(analysis["skin_subtype"])
+    scores = main.score_palette(skin_features, palette)
+    feature_model, feature_encoder = main.models.get("feature_model")
+    outfit_model, outfit_labels = main.models.get(main.outfit_model_name(gender))
+    placement_tree = main.models.get("color_placement_tree")
+    req = outfit_request(analysis, gender)
+
+    benchmarks = {}
+    for side, data in upload_data.items():
+        benchmarks[f"decode_image[{side}px]"] = lambda data=data: main.decode_image(data)
+    benchmarks.update({
+        "face_mesh": lambda: main.detect_landmarks(detect_rgb),
+        "sampling[lines]": lambda: sample_line_pairs(
+            sample_rgb, landmarks, gender=gender,
+            density=settings.SAMPLE_DENSITY, mode=settings.SAMPLE_MODE, patch=settings.SAMPLE_PATCH,
+        ),
+        "sampling[mask]": lambda: sample_region_mask(sample_rgb, landmarks, gender=gender),
+        "split_light_dark": lambda: split_light_dark(pixels),
+        "feature_model": lambda: feature_encoder.inverse_transform(feature_model.predict(features)),
+        "color_scoring": lambda: main.score_palette(skin_features, palette),
+        "diversity": lambda: select_palette(
+            palette, scores,
+            mode=settings.SELECTION_MODE, top_k=settings.SELECTION_TOP_K,
+            avoid_k=settings.SELECTION_AVOID_K, lam=settings.SELECTION_MMR_LAMBDA,
+        ),
+        "analyze_face_image": lambda: main.analyze_face_image(sample_rgb, gender=gender, landmarks=landmarks),
+        f"run_analysis[{UPLOAD_SIDES[1]}px]": lambda: main.run_analysis(upload_data[UPLOAD_SIDES[1]], None, gender),
+        "outfit_archetypes": lambda: main.candidate_archetypes(outfit_model, outfit_labels, np.array([[1, 0.8, 0.1]])),
+        "placement_tree": lambda: placement_tree.predict([[0.4, dark_score, 1]]),
+        "generate_ml_outfits": lambda: main.generate_ml_outfits(req, outfit_model, outfit_labels, placement_tree),
+    })
+    return benchmarks, analysis
+
+
+def run_micro(main, landmarks, sample_rgb, upload_data, min_time=0.5, log=print):
+    benchmarks, _ = micro_benchmarks(main, landmarks, sample_rgb, upload_data)
+    results = {}
+    for name, fn in benchmarks.items():
+        results[f"micro.{name}"] = stats = measure(fn, min_time)
+        log(f"  {name:<28} median {stats['median_ms']:9.3f} ms   p95 {stats['p95_ms']:9.3f} ms   n={stats['n']}")
+    return results
+
+# =========================
+# MACRO
+# =========================
+async def drive(send, n_requests, concurrency):
+    # Sends n_requests with `concurrency` in flight; returns (latencies, errors, wall seconds)
+    latencies, errors = [], 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < n_requests:
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                response = await send(index)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def _run_macro(main, analysis, upload, n_requests, concurrency_levels, log):
+    import httpx
+
+    genders = ("female", "male")
+    outfit_payloads = [
+        outfit_request(analysis, gender, event, season).model_dump()
+        for gender in genders
+        for event, season in (("work", "summer"), ("party", "winter"), ("wedding", "spring"), ("casual", "fall"))
+    ]
+
+    async def analyze(client, index):
+        return await client.post(
+            f"/analyze?gender={genders[index % 2]}",
+            files={"image": ("face.jpg", upload, "image/jpeg")},
+        )
+
+    async def outfits(client, index):
+        return await client.post("/api/outfits", json=outfit_payloads[index % len(outfit_payloads)])
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for endpoint, send, n in (("/analyze", analyze, n_requests), ("/api/outfits", outfits, n_requests * 4)):
+            await send(client, 0)  # first-request costs (e.g. outfit model load) stay out of the numbers
+            for concurrency in concurrency_levels:
+                latencies, errors, wall = await drive(lambda i: send(client, i), n, concurrency)
+                stats = summarize(latencies)
+                stats.update({
+                    "concurrency": concurrency,
+                    "errors": errors,
+                    "throughput_rps": round(len(latencies) / wall, 2),
+                })
+                results[f"macro.{endpoint}[c={concurrency}]"] = stats
+                log(
+                    f"  {endpoint:<13} c={concurrency:<3} median {stats['median_ms']:9.3f} ms   "
+                    f"p95 {stats['p95_ms']:9.3f} ms   {stats['throughput_rps']:8.1f} req/s   errors {errors}"
+                )
+    return results
+
+
+def run_macro(main, landmarks, sample_rgb, upload_data, upload_side, n_requests=64,
+              concurrency_levels=(1, 4, 16), log=print):
+    analysis, _ = main.analyze_face_image(sample_rgb, gender="female", landmarks=landmarks)
+    return asyncio.run(
+        _run_macro(main, analysis, upload_data[upload_side], n_requests, concurrency_levels, log)
+    )
+
+
+def load_app_models(main):
+    # Everything the benchmarks touch, loaded (and warmed up) before any timing starts
+    names = [name for name in main.models.names() if name != "analysis"]
+    main.models.load_all(names, threads=4)
+    failed = [name for name, info in main.models.states().items() if info["state"] == "failed"]
+    return failed
@@ -0,0 +1,43 @@
+import logging
+import os
+
+import joblib
+
+import settings
+from model_store import save_flat_model, save_label_encoder
+from tree_eval import FlatTreeEnsemble, compile_model
+
+# Writes the tree models and the feature label encoder into the memory-mapped model store
+# (see model_store.py). Each tree model is flattened and parity-checked against sklearn
+# first; models that fail stay pickles only.
+# Run at image build time, and again whenever a model pickle changes - the app ignores store
+# entries whose source pickle no longer matches.
+#
+#   MODEL_STORE_DIR=model_store python build_model_store.py
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
+MODELS = [
+    ("feature_model", "feature_model.pkl"),
+    ("color_model", settings.COLOR_MODEL_PATH),
+    ("color_placement_tree", "color_placement_tree.pkl"),
+]
+
+for name, path in MODELS:
+    if not os.path.exists(path):
+        print(f"{name}: {path} not found, skipped")
+        continue
+
+    flat = compile_model(joblib.load(path), name, settings.TREE_EVAL_MAX_BATCH)
+    if not isinstance(flat, FlatTreeEnsemble):
+        print(f"{name}: not stored (unsupported model or parity check failed)")
+        continue
+
+    save_flat_model(flat, settings.MODEL_STORE_DIR, name, source_path=path)
+    print(f"{name}: {flat.n_trees} trees, {flat.nbytes / 1024:.0f} KB in {settings.MODEL_STORE_DIR}/{name}")
+
+# The feature model's label encoder, so loading it does not need sklearn
+if os.path.exists("feature_encoder.pkl"):
+    encoder = joblib.load("feature_encoder.pkl")
+    save_label_encoder(encoder, settings.MODEL_STORE_DIR, "feature_encoder", source_path="feature_encoder.pkl")
+    print(f"feature_encoder: {len(encoder.classes_)} classes in {settings.MODEL_STORE_DIR}/feature_encoder")
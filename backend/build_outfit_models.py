@@ -0,0 +1,43 @@
+import logging
+import warnings
+
+import joblib
+
+import settings
+from outfit_models import build_archetype_table, evaluate_model, save_table
+
+# Converts the outfit KNN pickles into the archetype lookup tables in outfit_models.py.
+# Re-run whenever a KNN model or its labels change; the app ignores tables whose source
+# pickles no longer match. Each table records its agreement with the KNN (evaluate_model);
+# the app skips tables whose pick_tv is above OUTFIT_MODEL_MAX_PICK_TV.
+#
+#   OUTFIT_TABLE_STEPS=161 python build_outfit_models.py
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+warnings.filterwarnings("ignore", category=UserWarning, module="sklearn")
+
+
+def check_agreement(path, accuracy):
+    if accuracy["pick_tv"] > settings.OUTFIT_MODEL_MAX_PICK_TV:
+        print(
+            f"  warning: pick TV {accuracy['pick_tv']} exceeds OUTFIT_MODEL_MAX_PICK_TV "
+            f"({settings.OUTFIT_MODEL_MAX_PICK_TV}); the app will not use {path}"
+        )
+
+
+MODELS = [
+    ("outfit_knn_model.pkl", "outfit_knn_labels.pkl", settings.OUTFIT_TABLE_PATH),
+    ("male_outfit_knn_model.pkl", "male_outfit_knn_labels.pkl", settings.MALE_OUTFIT_TABLE_PATH),
+]
+
+for knn_path, labels_path, table_path in MODELS:
+    knn_model = joblib.load(knn_path)
+    knn_labels = joblib.load(labels_path)
+    sources = (knn_path, labels_path)
+
+    table = build_archetype_table(knn_model, knn_labels, settings.OUTFIT_TABLE_STEPS)
+    table.meta["accuracy"] = evaluate_model(table, knn_model, knn_labels)
+    save_table(table, table_path, source_paths=sources)
+    print(f"{table_path}: {table.nbytes / 1024:.0f} KB, agreement with {knn_path}: {table.meta['accuracy']}")
+    check_agreement(table_path, table.meta["accuracy"])
+
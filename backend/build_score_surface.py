@@ -0,0 +1,32 @@
+import logging
+import os
+import sys
+
+import joblib
+
+import settings
+from score_surface import build_score_surface, evaluate_accuracy, save_surface
+
+# Precomputes color_model scores for every catalogue color on a grid over skin-feature space
+# (see score_surface.py). Run at image build time, and again whenever color_model.pkl or
+# color_maps.py changes - the app ignores a surface whose model or catalogue fingerprint no
+# longer matches.
+#
+#   SCORE_SURFACE_STEPS=17,17,17,11 python build_score_surface.py
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
+if not os.path.exists(settings.COLOR_MODEL_PATH):
+    print(f"color_model: {settings.COLOR_MODEL_PATH} not found, no score surface built")
+    sys.exit(0)
+
+color_model = joblib.load(settings.COLOR_MODEL_PATH)
+
+surface = build_score_surface(color_model, settings.SCORE_SURFACE_STEPS)
+surface.meta["accuracy"] = evaluate_accuracy(
+    surface, color_model, interpolation=settings.SCORE_SURFACE_INTERPOLATION
+)
+save_surface(surface, settings.SCORE_SURFACE_PATH, model_path=settings.COLOR_MODEL_PATH)
+
+print(f"Score surface saved to {settings.SCORE_SURFACE_PATH} ({surface.nbytes / 1e6:.1f} MB)")
+print(f"Accuracy vs live model (score points): {surface.meta['accuracy']}")
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    # Bounded, thread-safe LRU cache with hit/miss/eviction counters.
+    # Entries can optionally expire after `ttl` seconds, and the cache can be bounded by
+    # the total `sizeof(value)` of its entries in addition to the entry count.
+    def __init__(self, maxsize, ttl=None, max_bytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires_at, nbytes = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.nbytes -= nbytes
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        nbytes = self.sizeof(value) if self.sizeof else 0
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[2]
+            self._data[key] = (value, expires_at, nbytes)
+            self.nbytes += nbytes
+            while len(self._data) > self.maxsize or (
+                self.max_bytes is not None and self.nbytes > self.max_bytes
+            ):
+                _, (_, _, evicted_bytes) = self._data.popitem(last=False)
+                self.nbytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+        if self.ttl:
+            stats["ttl"] = self.ttl
+            stats["expirations"] = self.expirations
+        if self.max_bytes is not None:
+            stats["bytes"] = self.nbytes
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+def quantize(values, steps):
+    return tuple(
+        round(float(v) / step) if step > 0 else float(v)
+        for v, step in zip(values, steps)
+    )
@@ -0,0 +1,290 @@
+import logging
+import os
+import sys
+import warnings
+
+import joblib
+import numpy as np
+
+import settings
+
+# Checks that the optimized code paths still give the results of the code they replaced:
+#   trees     tree_eval's flat evaluator (and the model store) predict exactly like sklearn
+#   outfits   the archetype tables hold the KNN's answer at every grid point, and their pick
+#             frequencies stay within OUTFIT_MODEL_MAX_PICK_TV of the KNN's
+#   palettes  selection.select_palette picks what the original dict-scanning passes picked
+#   sampling  skin_sampling.sample_line_pairs reads the pixels the original per-point loop read
+# Run from backend/ after changing any of them, or a model / table they use; exits with status
+# 1 on any difference. Checks whose model files are missing are skipped.
+#
+#   python check_parity.py [trees|outfits|palettes|sampling ...]
+
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)s | %(message)s")
+warnings.filterwarnings("ignore", category=UserWarning, module="sklearn")
+
+# =========================
+# TREES
+# =========================
+def synthetic_tree_models(seed=0):
+    # One small fitted model of every type flatten_model supports
+    from sklearn.ensemble import (
+        ExtraTreesClassifier,
+        ExtraTreesRegressor,
+        GradientBoostingClassifier,
+        GradientBoostingRegressor,
+        RandomForestClassifier,
+        RandomForestRegressor,
+    )
+    from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(400, 5)).astype(np.float32)
+    y_class = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int) + (X[:, 3] > 1)
+    y_reg = X[:, 0] * 2 + np.sin(X[:, 1]) + rng.normal(0, 0.1, len(X))
+    classifiers = [
+        DecisionTreeClassifier(max_depth=8, random_state=seed),
+        RandomForestClassifier(n_estimators=20, max_depth=6, random_state=seed),
+        ExtraTreesClassifier(n_estimators=20, max_depth=6, random_state=seed),
+        GradientBoostingClassifier(n_estimators=20, max_depth=3, random_state=seed),
+    ]
+    regressors = [
+        DecisionTreeRegressor(max_depth=8, random_state=seed),
+        RandomForestRegressor(n_estimators=20, max_depth=6, random_state=seed),
+        ExtraTreesRegressor(n_estimators=20, max_depth=6, random_state=seed),
+        GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=seed),
+    ]
+    binary = GradientBoostingClassifier(n_estimators=20, max_depth=3, random_state=seed)
+    models = [(type(m).__name__, m.fit(X, y_class)) for m in classifiers]
+    models += [(type(m).__name__, m.fit(X, y_reg)) for m in regressors]
+    models.append(("GradientBoostingClassifier (binary)", binary.fit(X, y_class > 0)))
+    return models
+
+
+def compare_tree_model(name, model, flat, seed=0):
+    from tree_eval import parity_inputs
+
+    rng = np.random.default_rng(seed)
+    X = np.concatenate([
+        parity_inputs(flat, 2000, seed),
+        rng.normal(0, 3, (500, flat.n_features_in_)).astype(np.float32),
+    ])
+    expected = model.predict(X)
+    actual = np.concatenate([flat.predict(X[i:i + flat.max_batch]) for i in range(0, len(X), flat.max_batch)])
+    if not np.array_equal(actual, expected):
+        return [f"{name}: differs from sklearn on {int(np.sum(actual != expected))}/{len(X)} rows"]
+    return []
+
+
+def check_trees():
+    from model_store import load_flat_model
+    from tree_eval import flatten_model
+
+    failures = []
+    for name, model in synthetic_tree_models():
+        flat = flatten_model(model)
+        if flat is None:
+            failures.append(f"{name}: not supported by flatten_model")
+            continue
+        failures += compare_tree_model(name, model, flat)
+
+    for name, path in (
+        ("feature_model", "feature_model.pkl"),
+        ("color_model", settings.COLOR_MODEL_PATH),
+        ("color_placement_tree", "color_placement_tree.pkl"),
+    ):
+        if not os.path.exists(path):
+            print(f"  {name}: {path} not found, skipped")
+            continue
+        model = joblib.load(path)
+        flat = flatten_model(model)
+        if flat is None:
+            print(f"  {name}: {type(model).__name__} not supported, served by sklearn")
+            continue
+        failures += compare_tree_model(name, model, flat)
+
+        if settings.MODEL_STORE_DIR:
+            stored = load_flat_model(settings.MODEL_STORE_DIR, name, source_path=path)
+            if stored is None:
+                print(f"  {name}: no current model store entry, skipped")
+            else:
+                failures += compare_tree_model(f"{name} (model store)", model, stored)
+    return failures
+
+# =========================
+# OUTFITS
+# =========================
+def check_outfits():
+    from outfit_models import N_EVENTS, evaluate_model, knn_archetypes, load_table
+
+    failures = []
+    for knn_path, labels_path, table_path in (
+        ("outfit_knn_model.pkl", "outfit_knn_labels.pkl", settings.OUTFIT_TABLE_PATH),
+        ("male_outfit_knn_model.pkl", "male_outfit_knn_labels.pkl", settings.MALE_OUTFIT_TABLE_PATH),
+    ):
+        if not all(os.path.exists(p) for p in (knn_path, labels_path, table_path)):
+            print(f"  {table_path}: model files not found, skipped")
+            continue
+        table = load_table(table_path, source_paths=(knn_path, labels_path))
+        if table is None:
+            failures.append(f"{table_path}: stale, rebuild it with build_outfit_models.py")
+            continue
+        knn_model = joblib.load(knn_path)
+        knn_labels = joblib.load(labels_path)
+
+        # Every grid point is a KNN query the table answers from its own cell
+        axis = np.linspace(0.0, 1.0, table.steps)
+        f, w = np.meshgrid(axis, axis, indexing="ij")
+        for event in range(N_EVENTS):
+            X = np.column_stack([np.full(f.size, event, dtype=np.float64), f.ravel(), w.ravel()])
+            expected = knn_archetypes(knn_model, knn_labels, X).reshape(table.steps, table.steps)
+            mismatches = int(np.sum(expected != table.masks[event]))
+            if mismatches:
+                failures.append(f"{table_path}: event {event} differs from the KNN at {mismatches} grid points")
+
+        accuracy = evaluate_model(table, knn_model, knn_labels)
+        print(f"  {table_path}: {accuracy}")
+        if accuracy["pick_tv"] > settings.OUTFIT_MODEL_MAX_PICK_TV:
+            failures.append(
+                f"{table_path}: pick TV {accuracy['pick_tv']} above OUTFIT_MODEL_MAX_PICK_TV "
+                f"({settings.OUTFIT_MODEL_MAX_PICK_TV})"
+            )
+    return failures
+
+# =========================
+# PALETTES
+# =========================
+def reference_selection(scored_recommended, scored_avoid, top_k=8, avoid_k=4):
+    # The selection rank_palette made before selection.py, on lists of color dicts
+    scored_recommended = sorted(scored_recommended, key=lambda x: x.get("match_score", 0), reverse=True)
+
+    final_recommended = []
+    seen_rec_families = set()
+    for c in scored_recommended:
+        family = c.get("family", "Unknown")
+        if family not in seen_rec_families:
+            final_recommended.append(c)
+            seen_rec_families.add(family)
+        if len(final_recommended) == top_k:
+            break
+    for c in scored_recommended:
+        if c not in final_recommended:
+            final_recommended.append(c)
+
+    scored_avoid = sorted(scored_avoid, key=lambda x: x.get("match_score", 0))
+    final_avoid = []
+    seen_avoid_families = set()
+    for c in scored_avoid:
+        family = c.get("family", "Unknown")
+        if family not in seen_avoid_families and c not in final_recommended:
+            final_avoid.append(c)
+            seen_avoid_families.add(family)
+        if len(final_avoid) == avoid_k:
+            break
+    if len(final_avoid) < avoid_k:
+        for c in scored_avoid:
+            if c not in final_recommended and c not in final_avoid:
+                final_avoid.append(c)
+            if len(final_avoid) == avoid_k:
+                break
+    return final_recommended, final_avoid
+
+
+def check_palettes(trials=200, seed=0):
+    from palette import PALETTES
+    from selection import select_palette
+
+    rng = np.random.default_rng(seed)
+    failures = []
+    for subtype, palette in sorted(PALETTES.items()):
+        n_rec = palette.n_recommended
+        for trial in range(trials):
+            # A color always gets one score (the model scores its features); every other
+            # trial uses a few integer scores so that ties are common
+            per_color = rng.uniform(0, 100, palette.color_ids.max() + 1)
+            if trial % 2:
+                per_color = np.floor(per_color / 25) * 25
+            scores = per_color[palette.color_ids]
+
+            expected = reference_selection(
+                palette.items(range(n_rec), scores), palette.items(range(n_rec, len(palette)), scores)
+            )
+            recommended, avoid = select_palette(palette, scores, mode="family", top_k=8, avoid_k=4)
+            actual = (palette.items(recommended, scores), palette.items(avoid, scores))
+            if actual != expected:
+                failures.append(f"{subtype}: selection differs from the original passes (trial {trial})")
+                break
+    return failures
+
+# =========================
+# SAMPLING
+# =========================
+def reference_line_samples(rgb_image, landmarks, gender):
+    # The per-point loop analyze_face_image sampled with before skin_sampling.py
+    from skin_sampling import FEMALE_PAIRS, LANDMARKS, MALE_PAIRS, calculate_brightness
+
+    h, w, _ = rgb_image.shape
+    points = {name: (int(landmarks[i][0] * w), int(landmarks[i][1] * h)) for name, i in LANDMARKS.items()}
+    pairs = MALE_PAIRS if gender == "male" else FEMALE_PAIRS
+
+    sample_points = []
+    for s, e in pairs:
+        x1, y1 = points[s]
+        x2, y2 = points[e]
+        for i in range(1, 6):
+            t = i / 6
+            sample_points.append((int(x1 + t * (x2 - x1)), int(y1 + t * (y2 - y1))))
+
+    light, dark = [], []
+    for x, y in sample_points:
+        if 0 <= y < h and 0 <= x < w:
+            r, g, b = rgb_image[y, x]
+            if calculate_brightness(r, g, b) > 130:
+                light.append((r, g, b))
+            else:
+                dark.append((r, g, b))
+    return light, dark
+
+
+def check_sampling(trials=300, seed=0):
+    from skin_sampling import sample_line_pairs, split_light_dark
+
+    recorded = np.load(os.path.join("benchmarks", "fixtures", "face_landmarks.npz"))["landmarks"]
+    rng = np.random.default_rng(seed)
+    failures = []
+    for trial in range(trials):
+        h, w = rng.integers(20, 900, 2)
+        rgb_image = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        # The recorded face, moved and scaled so that some points fall outside the image
+        landmarks = (recorded - 0.5) * rng.uniform(0.3, 1.6) + 0.5 + rng.normal(0, 0.2, 2)
+        for gender in ("female", "male"):
+            light, dark = split_light_dark(sample_line_pairs(rgb_image, landmarks, gender=gender, density=5))
+            expected_light, expected_dark = reference_line_samples(rgb_image, landmarks, gender)
+            if light.tolist() != [list(p) for p in expected_light] or dark.tolist() != [list(p) for p in expected_dark]:
+                failures.append(f"{gender} sampling differs from the original loop ({w}x{h} image, trial {trial})")
+                return failures
+    return failures
+
+
+CHECKS = {
+    "trees": check_trees,
+    "outfits": check_outfits,
+    "palettes": check_palettes,
+    "sampling": check_sampling,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(CHECKS)
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        sys.exit(f"Unknown check(s): {', '.join(unknown)} (choose from {', '.join(CHECKS)})")
+
+    failed = 0
+    for name in names:
+        print(f"{name}:")
+        failures = CHECKS[name]()
+        for failure in failures:
+            print(f"  FAIL {failure}")
+        if not failures:
+            print("  ok")
+        failed += len(failures)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+MODES = ("inline", "thread", "process")
+
+
+class ExecutorBusy(Exception):
+    pass
+
+
+class AnalysisExecutor:
+    # Runs CPU-bound analysis off the event loop.
+    #   inline  - run directly in the calling coroutine (no pool)
+    #   thread  - run in a thread pool; shared state (FaceMesh, caches) must be thread-safe
+    #   process - run in a pool of spawned worker processes; each worker imports the app module
+    #             on first use and so holds its own FaceMesh, models and caches
+    # At most `workers + queue_depth` jobs are accepted at once; the rest get ExecutorBusy.
+    # A job keeps its slot until it has finished in the pool, even if the request awaiting it
+    # is cancelled. Exceptions of the `client_errors` types (bad input) are counted as
+    # `invalid` rather than `failed`.
+    def __init__(self, mode="inline", workers=2, queue_depth=16, client_errors=()):
+        if mode not in MODES:
+            logger.warning(f"Unknown executor mode '{mode}', using inline")
+            mode = "inline"
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self.client_errors = tuple(client_errors)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Slots are released from pool threads (see _job_done)
+        self._count_lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.invalid = 0
+        self.rejected = 0
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None and self.mode == "thread":
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="analysis",
+                )
+                logger.info(f"Started analysis thread pool ({self.workers} workers)")
+            elif self._pool is None:
+                # spawn, not fork: MediaPipe graphs and their threads do not survive a fork
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                logger.info(f"Started analysis process pool ({self.workers} workers)")
+            return self._pool
+
+    def _reset_pool(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    async def run(self, fn, *args):
+        with self._count_lock:
+            if self.pending >= self.workers + self.queue_depth:
+                self.rejected += 1
+                raise ExecutorBusy("Server busy, please retry")
+            self.pending += 1
+
+        if self.mode == "inline":
+            try:
+                result = fn(*args)
+            except Exception as e:
+                self._release(e)
+                raise
+            self._release(None)
+            return result
+
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BrokenProcessPool as e:
+            self._release(e)
+            logger.error("Analysis process pool is broken, restarting it")
+            self._reset_pool()
+            raise
+        except Exception as e:
+            self._release(e)
+            raise
+        future.add_done_callback(self._job_done)
+
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            logger.error("Analysis worker died, restarting process pool")
+            self._reset_pool()
+            raise
+
+    def _job_done(self, future):
+        # Runs when the job has finished in the pool, or was cancelled before it started (the
+        # awaiting request went away while it was queued); not when a request stops waiting
+        # for a job that is still running
+        if future.cancelled():
+            self._release(None, finished=False)
+        else:
+            self._release(future.exception())
+
+    def _release(self, error, finished=True):
+        with self._count_lock:
+            self.pending -= 1
+            if not finished:
+                return
+            if error is None:
+                self.completed += 1
+            elif isinstance(error, self.client_errors):
+                self.invalid += 1
+            else:
+                self.failed += 1
+
+    def warm_up(self, fn, *args):
+        # Runs fn once per worker (best effort for pools: the jobs are submitted together, so
+        # each idle worker picks one up) and returns the results
+        if self.mode == "inline":
+            return [fn(*args)]
+        pool = self._get_pool()
+        futures = [pool.submit(fn, *args) for _ in range(self.workers)]
+        try:
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            logger.error("Analysis worker died during warm-up, restarting process pool")
+            self._reset_pool()
+            raise
+
+    def shutdown(self):
+        self._reset_pool()
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": min(self.pending, self.workers),
+            "queued": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "invalid": self.invalid,
+            "rejected": self.rejected,
+        }
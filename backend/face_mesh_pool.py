@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class FaceMeshTimeout(Exception):
+    pass
+
+
+class FaceMeshPool:
+    # Checkout/return pool of FaceMesh graphs. A graph is never used by two threads at once.
+    # Instances are created lazily by `factory`, up to `size`; callers wait up to `timeout`
+    # seconds for one to be returned once the pool is exhausted.
+    def __init__(self, factory, size=2, timeout=10.0):
+        self.factory = factory
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle = []
+        self._cond = threading.Condition()
+        self.created = 0
+        self.busy = 0
+        self.waiting = 0
+        self.timeouts = 0
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while not self._idle and self.created >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise FaceMeshTimeout("Timed out waiting for a free FaceMesh instance")
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            self.busy += 1
+            if self._idle:
+                return self._idle.pop()
+            self.created += 1
+
+        # Create outside the lock; graph init takes a while
+        try:
+            face_mesh = self.factory()
+        except Exception:
+            with self._cond:
+                self.created -= 1
+                self.busy -= 1
+                self._cond.notify()
+            raise
+        logger.info(f"Created FaceMesh instance {self.created}/{self.size}")
+        return face_mesh
+
+    def _release(self, face_mesh):
+        with self._cond:
+            self._idle.append(face_mesh)
+            self.busy -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        face_mesh = self._acquire(self.timeout if timeout is None else timeout)
+        try:
+            yield face_mesh
+        finally:
+            self._release(face_mesh)
+
+    def reset(self):
+        # Drops idle graphs, e.g. ones created in a gunicorn master before it forked workers;
+        # MediaPipe graphs and their threads do not survive a fork
+        with self._cond:
+            dropped = len(self._idle)
+            self._idle.clear()
+            self.created -= dropped
+            self._cond.notify_all()
+        return dropped
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "created": self.created,
+            "busy": self.busy,
+            "idle": len(self._idle),
+            "waiting": self.waiting,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,32 @@
+import gc
+import os
+import sys
+
+# Gunicorn settings for the Docker image (see Dockerfile). WEB_CONCURRENCY sets the number
+# of workers; with preload_app the app is imported once in the master, so models, the model
+# store mappings and the score surface are shared copy-on-write by every worker.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+def when_ready(server):
+    # Preloaded app: load every model in the master so workers inherit them instead of each
+    # loading their own
+    app_module = sys.modules.get("main")
+    if preload_app and app_module is not None:
+        app_module.preload_models()
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach; otherwise the first GC pass
+    # in a worker touches (and so copies) every page holding a preloaded object
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    app_module = sys.modules.get("main")
+    if app_module is not None:
+        app_module.after_fork()
@@ -0,0 +1,95 @@
+import io
+import logging
+import math
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+import settings
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# PIL's own bomb check is a last line of defence; our limit is enforced before decoding
+Image.MAX_IMAGE_PIXELS = settings.MAX_IMAGE_PIXELS
+
+
+class ImageRejected(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+    def __reduce__(self):
+        # Keep the status code when raised inside a process-pool worker
+        return ImageRejected, (str(self), self.status_code)
+
+
+def probe_image(image_bytes):
+    # Parses only the header: no pixel data is decoded or allocated here
+    try:
+        pil_image = Image.open(io.BytesIO(image_bytes))
+    except Image.DecompressionBombError:
+        raise ImageRejected("Image too large", status_code=413)
+    except UnidentifiedImageError:
+        raise ImageRejected("Invalid image file")
+
+    w, h = pil_image.size
+    if w <= 0 or h <= 0:
+        raise ImageRejected("Invalid image file")
+    if w * h > settings.MAX_IMAGE_PIXELS or max(w, h) > settings.MAX_IMAGE_SIDE:
+        logger.warning(f"Rejected oversized upload ({w}x{h})")
+        raise ImageRejected("Image too large", status_code=413)
+    return pil_image
+
+
+def _fit(size, max_side):
+    w, h = size
+    scale = max_side / max(w, h)
+    if scale >= 1:
+        return size
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def decode_image(image_bytes):
+    # Returns (detect_rgb, sample_rgb): a buffer capped at DETECT_MAX_SIDE for FaceMesh and one
+    # capped at SAMPLE_MAX_SIDE for pixel sampling. Landmarks are normalized, so they map onto
+    # either buffer unchanged.
+    pil_image = probe_image(image_bytes)
+    w, h = pil_image.size
+
+    # The header parsed, but truncated or corrupt pixel data (or EXIF), or a mode that cannot be
+    # converted to RGB, only fails from here on
+    try:
+        with stage("decode"):
+            target_side = max(settings.SAMPLE_MAX_SIDE, settings.DETECT_MAX_SIDE)
+            if max(w, h) > target_side:
+                # JPEG only: let the decoder downscale by 1/2, 1/4 or 1/8 while staying >= target
+                scale = target_side / max(w, h)
+                pil_image.draft("RGB", (math.ceil(w * scale), math.ceil(h * scale)))
+            # Decode here rather than inside the transpose / convert below, so it is timed alone
+            pil_image.load()
+
+        with stage("exif_transpose"):
+            pil_image = ImageOps.exif_transpose(pil_image)
+
+        with stage("resize"):
+            pil_image = pil_image.convert("RGB")
+
+            sample_size = _fit(pil_image.size, settings.SAMPLE_MAX_SIDE)
+            if sample_size != pil_image.size:
+                pil_image = pil_image.resize(sample_size, Image.BOX)
+            sample_rgb = np.array(pil_image, dtype=np.uint8)
+
+            detect_size = _fit(pil_image.size, settings.DETECT_MAX_SIDE)
+            if detect_size != pil_image.size:
+                detect_rgb = np.array(pil_image.resize(detect_size, Image.BOX), dtype=np.uint8)
+            else:
+                detect_rgb = sample_rgb
+    except Image.DecompressionBombError:
+        raise ImageRejected("Image too large", status_code=413)
+    except (OSError, SyntaxError, ValueError) as e:
+        logger.warning(f"Rejected undecodable upload ({w}x{h}): {e}")
+        raise ImageRejected("Invalid image file")
+
+    logger.info(f"Decoded {w}x{h} upload (detect {detect_size}, sample {sample_size})")
+    return detect_rgb, sample_rgb
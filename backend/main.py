@@ -1,17 +1,51 @@
-from fastapi import FastAPI, UploadFile, File
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.requests import ClientDisconnect
 
-import io
+import asyncio
+import hashlib
+import json
 import logging
+from typing import List, Optional
 
 import numpy as np
-from mediapipe import solutions as mp_solutions
 
 
-from PIL import Image, ImageOps
-from color_maps import seasonal_recommended_colors, seasonal_avoid_colors
-import joblib
+from image_io import ImageRejected, decode_image
+from executor import AnalysisExecutor, ExecutorBusy
+from face_mesh_pool import FaceMeshPool, FaceMeshTimeout
+from palette import get_palette
+from selection import select_palette
+from score_surface import build_score_surface, evaluate_accuracy, load_surface, save_surface
+from model_store import load_encoder, load_model, load_pickle
+from model_registry import ModelRegistry
+from outfit_models import load_table
+from skin_sampling import (
+    SAMPLING_METHODS,
+    calculate_brightness,
+    sample_line_pairs,
+    sample_region_mask,
+    split_light_dark,
+)
+from caches import LRUCache, quantize
+from multipart_stream import BodyStreamingResponse, MultipartError, PartStream, wait_for_disconnect
+from profiling import RequestProfiler, run_profiled
+from metrics import (
+    NULL_TIMER,
+    StageTimer,
+    mark,
+    observe_request,
+    observe_stages,
+    registry as metrics_registry,
+    server_timing,
+    stage,
+    start_stage,
+)
+import settings
 import warnings
 
 # =========================
@@ -39,193 +73,458 @@ app = FastAPI()
 # =========================
 # CORS SETUP
 # =========================
+CORS_ORIGINS = [
+    "https://moodwear.vercel.app",
+    "https://skintone.onrender.com",
+    "http://localhost:5173",
+    "http://localhost:8000"
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "https://moodwear.vercel.app",
-        "https://skintone.onrender.com",
-        "http://localhost:5173",
-        "http://localhost:8000"
-    ],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read Server-Timing (and the id of profiled requests) from fetch responses
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
 
+# Lets the frontend's Resource Timing entries see Server-Timing on cross-origin requests
+TIMING_ALLOW_ORIGIN = ", ".join(CORS_ORIGINS)
+
 logger.info("FastAPI app initialized")
 
 # =========================
 # MEDIAPIPE SETUP
 # =========================
-mp_face_mesh = mp_solutions.face_mesh
-
-face_mesh = mp_face_mesh.FaceMesh(
-    static_image_mode=True,
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.5
+def create_face_mesh():
+    # mediapipe is imported on first use; it is the slowest import of the app
+    from mediapipe import solutions as mp_solutions
+
+    return mp_solutions.face_mesh.FaceMesh(
+        static_image_mode=True,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5
+    )
+
+# FaceMesh graphs are not thread-safe: every detection checks one out of this pool
+face_mesh_pool = FaceMeshPool(
+    create_face_mesh,
+    size=settings.FACE_MESH_POOL_SIZE,
+    timeout=settings.FACE_MESH_TIMEOUT,
 )
 
-logger.info("MediaPipe FaceMesh loaded")
+def init_face_mesh():
+    # Creates the first pooled graph ahead of the first request
+    with face_mesh_pool.checkout():
+        pass
+    return face_mesh_pool
+
+def after_fork():
+    # Called by gunicorn.conf.py in every worker when the app is preloaded in the master.
+    # Models and mapped buffers are inherited and shared; FaceMesh graphs are per process.
+    dropped = face_mesh_pool.reset()
+    if dropped:
+        logger.info(f"Dropped {dropped} FaceMesh instance(s) inherited from the master")
 
 # =========================
 # ML MODEL SETUP
 # =========================
-try:
-    feature_model = joblib.load("feature_model.pkl")
-    feature_encoder = joblib.load("feature_encoder.pkl")
-    logger.info("New Feature-based ML model loaded")
-except Exception as e:
-    logger.error(f"Failed to load new ML model: {e}")
-    feature_model = None
-    feature_encoder = None
-
-try:
-    color_model = joblib.load("color_model.pkl")
-    logger.info("Color Compatibility model loaded")
-except Exception as e:
-    logger.error(f"Failed to load Color Compatibility model: {e}")
-    color_model = None
-
-try:
-    outfit_knn_model = joblib.load("outfit_knn_model.pkl")
-    outfit_knn_labels = joblib.load("outfit_knn_labels.pkl")
-    
-    # Load Male Models
-    try:
-        male_outfit_knn_model = joblib.load("male_outfit_knn_model.pkl")
-        male_outfit_knn_labels = joblib.load("male_outfit_knn_labels.pkl")
-        logger.info("Male Outfit Gen ML models loaded")
-    except Exception as me:
-        logger.warning(f"Failed to load Male Outfit models: {me}")
-        male_outfit_knn_model = None
-        male_outfit_knn_labels = None
-
-    color_placement_tree = joblib.load("color_placement_tree.pkl")
-    logger.info("Outfit Gen ML models loaded")
-except Exception as e:
-    logger.error(f"Failed to load Outfit Gen ML models: {e}")
-    outfit_knn_model = None
-    outfit_knn_labels = None
-    male_outfit_knn_model = None
-    male_outfit_knn_labels = None
-    color_placement_tree = None
-
-logger.info("Models loaded attempt complete.")
+def load_tree_model(path, name):
+    # Memory-mapped flat trees from the model store when available, otherwise the pickle
+    # (flattened with the NumPy evaluator when TREE_EVAL_ENABLED, sklearn as the fallback)
+    return load_model(
+        path,
+        name,
+        store_dir=settings.MODEL_STORE_DIR,
+        mmap_mode=settings.MODEL_MMAP_MODE,
+        tree_eval=settings.TREE_EVAL_ENABLED,
+        max_batch=settings.TREE_EVAL_MAX_BATCH,
+    )
+
+def load_feature_model():
+    feature_model = load_tree_model("feature_model.pkl", "feature_model")
+    feature_encoder = load_encoder(
+        "feature_encoder.pkl", "feature_encoder", settings.MODEL_STORE_DIR, settings.MODEL_MMAP_MODE
+    )
+    return feature_model, feature_encoder
+
+def load_color_model():
+    return load_tree_model(settings.COLOR_MODEL_PATH, "color_model")
 
 # =========================
-# HELPERS
+# COLOR SCORE SURFACE
 # =========================
-def calculate_brightness(r, g, b):
-    return 0.299 * r + 0.587 * g + 0.114 * b
+def load_color_score_surface():
+    color_model = models.get("color_model")
+    if color_model is None or not settings.SCORE_SURFACE_ENABLED:
+        return None
+
+    surface = load_surface(
+        settings.SCORE_SURFACE_PATH,
+        model_path=settings.COLOR_MODEL_PATH,
+        mmap_bytes=settings.SCORE_SURFACE_MMAP_BYTES,
+    )
+    if surface is None and settings.SCORE_SURFACE_BUILD_ON_STARTUP:
+        surface = build_score_surface(color_model, settings.SCORE_SURFACE_STEPS)
+        surface.meta["accuracy"] = evaluate_accuracy(
+            surface, color_model, interpolation=settings.SCORE_SURFACE_INTERPOLATION
+        )
+        try:
+            save_surface(surface, settings.SCORE_SURFACE_PATH, model_path=settings.COLOR_MODEL_PATH)
+        except OSError as e:
+            logger.warning(f"Could not save score surface: {e}")
+    if surface is None:
+        return None
+
+    accuracy = surface.meta.get("accuracy", {})
+    logger.info(f"Color score surface loaded {tuple(surface.shape)} (accuracy vs live model: {accuracy})")
+    if accuracy.get("mae", 0) > settings.SCORE_SURFACE_MAX_MAE:
+        logger.warning("Score surface error is above SCORE_SURFACE_MAX_MAE, using live inference")
+        return None
+    return surface
 
+# =========================
+# OUTFIT MODELS
+# =========================
+OUTFIT_MODEL_FILES = {
+    "female": ("outfit_knn_model.pkl", "outfit_knn_labels.pkl", settings.OUTFIT_TABLE_PATH),
+    "male": ("male_outfit_knn_model.pkl", "male_outfit_knn_labels.pkl", settings.MALE_OUTFIT_TABLE_PATH),
+}
+
+def load_outfit_model(knn_path, labels_path, table_path):
+    # The archetype table (kilobytes) is preferred over unpickling the KNN (megabytes), unless
+    # settings.OUTFIT_MODEL is "knn" or the table is missing, stale or not close enough to the KNN
+    if settings.OUTFIT_MODEL == "knn":
+        table = None
+    else:
+        try:
+            table = load_table(table_path, source_paths=(knn_path, labels_path))
+        except Exception as e:
+            logger.warning(f"Failed to load outfit table {table_path}: {e}")
+            table = None
+
+    if table is not None:
+        pick_tv = table.meta.get("accuracy", {}).get("pick_tv")
+        if pick_tv is None or pick_tv > settings.OUTFIT_MODEL_MAX_PICK_TV:
+            logger.warning(
+                f"Outfit table {table_path} diverges from the KNN (pick TV {pick_tv}, "
+                f"max {settings.OUTFIT_MODEL_MAX_PICK_TV}), skipping it"
+            )
+        else:
+            logger.info(f"Outfit table loaded from {table_path} ({table.nbytes / 1024:.0f} KB, pick TV {pick_tv})")
+            return table, None
+    return load_pickle(knn_path, settings.MODEL_MMAP_MODE), load_pickle(labels_path, settings.MODEL_MMAP_MODE)
 
-def hex_to_rgb(hex_str):
-    hex_str = hex_str.lstrip('#')
-    return [int(hex_str[i:i+2], 16) for i in (0, 2, 4)]
+def outfit_model_name(gender):
+    return "outfit_model_male" if gender == "male" else "outfit_model_female"
 
+# =========================
+# MODEL REGISTRY
+# =========================
+# Nothing is loaded at import, so the app answers health checks right away. Components load
+# on first use, or ahead of time from the startup hook (see MODEL_INIT). Each one is warmed up
+# on built-in fixture inputs right after it loads (WARMUP_ENABLED).
+WARMUP_IMAGE_PATH = "fixtures/warmup_face.jpg"
+WARMUP_SKIN_FEATURES = [180.0, 140.0, 120.0, calculate_brightness(180.0, 140.0, 120.0), 3.0]
+WARMUP_SUBTYPE = "Light Warm"
+
+def warm_face_mesh(pool):
+    with open(WARMUP_IMAGE_PATH, "rb") as f:
+        detect_rgb, _ = decode_image(f.read())
+    if detect_landmarks(detect_rgb) is None:
+        raise RuntimeError("No face detected in the warm-up fixture")
+
+def warm_feature_model(feature_models):
+    feature_model, feature_encoder = feature_models
+    if feature_model is not None and feature_encoder is not None:
+        features = np.array([WARMUP_SKIN_FEATURES], dtype=np.float32)
+        feature_encoder.inverse_transform(feature_model.predict(features))
+
+def warm_color_model(color_model):
+    color_model.predict(get_palette(WARMUP_SUBTYPE).feature_matrix(WARMUP_SKIN_FEATURES))
+
+def warm_score_surface(surface):
+    surface.lookup(WARMUP_SKIN_FEATURES, get_palette(WARMUP_SUBTYPE).color_ids, settings.SCORE_SURFACE_INTERPOLATION)
+
+def warm_color_placement_tree(tree):
+    tree.predict([[0.4, 5.0, 1], [0.8, 7.0, 0]])
+
+def warm_outfit_model(outfit_models):
+    outfit_model, outfit_labels = outfit_models
+    if outfit_model is not None:
+        for event in range(5):
+            candidate_archetypes(outfit_model, outfit_labels, np.array([[event, 0.5, 0.5]]))
+
+def warm_analysis():
+    # End-to-end /analyze on the fixture, through the executor so that every pool worker
+    # (each process in "process" mode) pays its own first-call costs now
+    with open(WARMUP_IMAGE_PATH, "rb") as f:
+        image_bytes = f.read()
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    results = analysis_executor.warm_up(run_analysis, image_bytes, image_hash, "female")
+    errors = [error for _, error in results if error]
+    if errors:
+        raise RuntimeError(errors[0])
+    return {"runs": len(results), "skin_subtype": results[0][0]["skin_subtype"]}
+
+def _warmup(fn):
+    return fn if settings.WARMUP_ENABLED else None
+
+models = ModelRegistry()
+models.register("face_mesh", init_face_mesh, warmup=_warmup(warm_face_mesh), critical=True)
+models.register("feature_model", load_feature_model, default=(None, None), warmup=_warmup(warm_feature_model))
+models.register("color_model", load_color_model, warmup=_warmup(warm_color_model))
+models.register("color_score_surface", load_color_score_surface, warmup=_warmup(warm_score_surface))
+models.register(
+    "color_placement_tree",
+    lambda: load_tree_model("color_placement_tree.pkl", "color_placement_tree"),
+    warmup=_warmup(warm_color_placement_tree),
+)
+for _gender, _files in OUTFIT_MODEL_FILES.items():
+    models.register(
+        outfit_model_name(_gender),
+        lambda files=_files: load_outfit_model(*files),
+        default=(None, None),
+        warmup=_warmup(warm_outfit_model),
+    )
+if settings.WARMUP_ENABLED:
+    # Critical: a worker whose executor or pipeline cannot analyze the fixture (e.g. a broken
+    # process pool) must not be sent traffic
+    models.register("analysis", warm_analysis, critical=True)
+
+# Loaded by the background init; per-gender outfit models wait until that gender is requested
+BACKGROUND_COMPONENTS = ("face_mesh", "feature_model", "color_model", "color_score_surface", "color_placement_tree")
+if settings.WARMUP_ENABLED:
+    BACKGROUND_COMPONENTS += ("analysis",)
+
+# Components run_analysis needs ("face_mesh" creates the first graph of face_mesh_pool)
+ANALYSIS_COMPONENTS = ("face_mesh", "feature_model", "color_model", "color_score_surface")
+
+async def get_model(name):
+    # models.get for async handlers: a component that is not loaded yet, or is being loaded by
+    # the background init, is waited for on a worker thread instead of blocking the event loop
+    if models.loaded(name):
+        return models.get(name)
+    return await asyncio.to_thread(models.get, name)
+
+def preload_models():
+    # Called by gunicorn.conf.py in the master when preloading: every model is loaded once
+    # before the fork. FaceMesh graphs (and the analysis warm-up that needs them) cannot be
+    # shared with the workers, but importing mediapipe here still shares its modules.
+    import mediapipe  # noqa: F401
+
+    models.load_all(
+        [name for name in models.names() if name not in ("face_mesh", "analysis")],
+        settings.MODEL_INIT_THREADS,
+    )
 
+# =========================
+# CACHES
+# =========================
+palette_cache = LRUCache(settings.PALETTE_CACHE_SIZE)
+
+result_cache = LRUCache(
+    settings.RESULT_CACHE_SIZE if settings.RESULT_CACHE_ENABLED else 0,
+    ttl=settings.RESULT_CACHE_TTL,
+    max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+    sizeof=lambda result: len(json.dumps(result)),
+)
+
+landmark_cache = LRUCache(
+    settings.LANDMARK_CACHE_SIZE if settings.LANDMARK_CACHE_ENABLED else 0,
+    ttl=settings.LANDMARK_CACHE_TTL,
+    max_bytes=settings.LANDMARK_CACHE_MAX_BYTES,
+    sizeof=lambda face: sum(arr.nbytes for arr in face),
+)
+
+# =========================
+# EXECUTOR
+# =========================
+analysis_executor = AnalysisExecutor(
+    settings.ANALYSIS_EXECUTOR,
+    workers=settings.ANALYSIS_WORKERS,
+    queue_depth=settings.ANALYSIS_QUEUE_DEPTH,
+    client_errors=(ImageRejected,),
+)
+
+# =========================
+# METRICS
+# =========================
+@metrics_registry.collector
+def collect_runtime_gauges():
+    # Values kept by the caches, executor and FaceMesh pool, read at scrape time
+    caches = {"palette_cache": palette_cache, "result_cache": result_cache, "landmark_cache": landmark_cache}
+    executor = analysis_executor.stats()
+    pool = face_mesh_pool.stats()
+    return [
+        ("skintone_cache_entries", "gauge", "Entries held by this process's caches",
+         [({"cache": name}, len(cache)) for name, cache in caches.items()]),
+        ("skintone_executor_jobs", "gauge", "Analysis jobs running or queued in the executor",
+         [({"state": "in_flight"}, executor["in_flight"]), ({"state": "queued"}, executor["queued"])]),
+        ("skintone_executor_pending", "gauge", "Analysis jobs accepted by the executor and not finished",
+         [({}, analysis_executor.pending)]),
+        ("skintone_executor_capacity", "gauge", "Analysis jobs the executor accepts before answering 503",
+         [({}, executor["workers"] + executor["queue_depth"])]),
+        ("skintone_executor_rejected_total", "counter", "Analysis jobs rejected with 503 because the executor was full",
+         [({}, executor["rejected"])]),
+        # In "process" mode each executor worker has its own pool, so these stay at 0 here
+        ("skintone_face_mesh_busy", "gauge", "FaceMesh graphs checked out by this process",
+         [({}, pool["busy"])]),
+        ("skintone_face_mesh_waiting", "gauge", "Analyses waiting for a free FaceMesh graph in this process",
+         [({}, pool["waiting"])]),
+        ("skintone_face_mesh_timeouts_total", "counter", "Analyses that gave up waiting for a FaceMesh graph (503)",
+         [({}, pool["timeouts"])]),
+    ]
+
+# =========================
+# PROFILING
+# =========================
+profiler = RequestProfiler(
+    enabled=settings.PROFILE_ENABLED,
+    sample_rate=settings.PROFILE_SAMPLE_RATE,
+    header=settings.PROFILE_HEADER,
+    token=settings.PROFILE_TOKEN,
+    directory=settings.PROFILE_DIR,
+    max_files=settings.PROFILE_MAX_FILES,
+    control_file=settings.PROFILE_CONTROL_FILE,
+    check_interval=settings.PROFILE_CONTROL_INTERVAL,
+)
+
+# =========================
+# HELPERS
+# =========================
 def compute_average_color(pixels):
-    if not pixels:
+    if len(pixels) == 0:
         return [128, 128, 128], "#808080"
 
     avg = np.mean(np.array(pixels), axis=0).astype(np.uint8)
     return avg.tolist(), "#{:02x}{:02x}{:02x}".format(*avg)
 
+
+def score_palette(skin_features, palette):
+    # Score every color of the compiled palette: a grid lookup when a score surface is loaded,
+    # otherwise a single predict call on its (N x 8) matrix.
+    # Rows with an invalid hex, or that fail when the batch falls back to per-row prediction,
+    # keep the safe default of 50.0.
+    scores = [50.0] * len(palette)
+    row_idx = np.flatnonzero(palette.valid)
+    if len(row_idx) == 0:
+        return scores
+
+    preds = None
+    color_score_surface = models.get("color_score_surface")
+    if color_score_surface is not None:
+        try:
+            preds = color_score_surface.lookup(
+                skin_features, palette.color_ids[row_idx], settings.SCORE_SURFACE_INTERPOLATION
+            )
+        except Exception as e:
+            logger.error(f"Score surface lookup failed ({e}), using color model")
+
+    if preds is None:
+        color_model = models.get("color_model")
+        c_features = palette.feature_matrix(skin_features)[row_idx]
+        try:
+            preds = np.asarray(color_model.predict(c_features), dtype=np.float64)
+        except Exception as e:
+            # Isolate the bad rows by falling back to per-row predictions
+            logger.error(f"Batch color scoring failed ({e}), scoring colors individually")
+            preds = np.full(len(row_idx), np.nan)
+            for j in range(len(row_idx)):
+                try:
+                    preds[j] = float(color_model.predict(c_features[j:j + 1])[0])
+                except Exception as row_e:
+                    logger.error(f"Scoring failed for color {palette.fragments[row_idx[j]].get('name')}: {row_e}")
+
+    for i, pred_score in zip(row_idx, preds):
+        if np.isfinite(pred_score):
+            scores[i] = min(100.0, max(0.0, round(float(pred_score) * 100, 1)))
+    return scores
+
+
+def rank_palette(skin_features, palette):
+    # Score the curated recommended + avoid colors for this user in one model call
+    with stage("color_scoring"):
+        scores = score_palette(skin_features, palette)
+
+    # Return the full scored pool sorted by score instead of truncating to 8,
+    # so the frontend has options to randomly shuffle through on 'Refresh'.
+    # The top 8 (which the frontend initially shows) are still kept diverse.
+    with stage("diversity"):
+        recommended_idx, avoid_idx = select_palette(
+            palette,
+            scores,
+            mode=settings.SELECTION_MODE,
+            top_k=settings.SELECTION_TOP_K,
+            avoid_k=settings.SELECTION_AVOID_K,
+            lam=settings.SELECTION_MMR_LAMBDA,
+        )
+    return palette.items(recommended_idx, scores), palette.items(avoid_idx, scores)
+
+
 # =========================
 # CORE LOGIC
 # =========================
-def analyze_face_image(rgb_image: np.ndarray, gender: str = "female"):
+def detect_landmarks(rgb_image: np.ndarray):
+    # Returns the normalized (x, y) FaceMesh landmarks as an (N, 2) array, or None
+    waiting = start_stage("face_mesh_wait")
+    with face_mesh_pool.checkout() as face_mesh:
+        waiting.stop()
+        with stage("face_mesh"):
+            results = face_mesh.process(rgb_image)
+
+    if not results.multi_face_landmarks:
+        return None
+
+    return np.array(
+        [(p.x, p.y) for p in results.multi_face_landmarks[0].landmark],
+        dtype=np.float32,
+    )
+
+
+def analyze_face_image(rgb_image: np.ndarray, gender: str = "female", landmarks=None, sampling=None):
     logger.info("Starting accurate model-based face analysis")
 
     h, w, _ = rgb_image.shape
 
-    results = face_mesh.process(rgb_image)
+    if landmarks is None:
+        landmarks = detect_landmarks(rgb_image)
 
-    if not results.multi_face_landmarks:
+    if landmarks is None:
         return None, "No face detected"
 
-    landmarks = results.multi_face_landmarks[0].landmark
-
-    # Convert normalized → pixel coordinates
-    def lm(idx):
-        return int(landmarks[idx].x * w), int(landmarks[idx].y * h)
-
-    try:
-        points = {
-            "jaw_left": lm(234),
-            "jaw_right": lm(454),
-            "jaw_center": lm(152),
-            "nose": lm(6),
-            "left_cheek": lm(93),
-            "right_cheek": lm(323),
-            "left_mid": lm(205),
-            "right_mid": lm(425),
-            "mouth_left": lm(61),
-            "mouth_right": lm(291),
-            "forehead_center": lm(10),
-            "forehead_left": lm(107),
-            "forehead_right": lm(336),
-        }
-    except Exception as e:
-        logger.error(f"Landmark extraction failed: {e}")
-        return None, "Complex face detection error"
+    sampling = sampling or settings.SAMPLING_METHOD
+    if sampling not in SAMPLING_METHODS:
+        return None, f"Unknown sampling method '{sampling}'"
 
-    # =========================
-    # SAMPLE PAIRS (LOGIC PRESERVED)
-    # =========================
     if gender == 'male':
-        # Skip everything connected to jaw landmarks (152, 234, 454) to avoid beard
-        pairs = [
-            ("left_cheek", "nose"),
-            ("right_cheek", "nose"),
-            ("left_mid", "nose"),
-            ("right_mid", "nose"),
-            ("forehead_center", "nose"),
-            ("forehead_left", "forehead_center"),
-            ("forehead_right", "forehead_center"),
-            ("left_cheek", "left_mid"),
-            ("right_cheek", "right_mid"),
-        ]
-        logger.info("Using male-specific landmark pairs (skipping jaw)")
-    else:
-        pairs = [
-            ("jaw_left", "nose"),
-            ("jaw_right", "nose"),
-            ("left_cheek", "nose"),
-            ("right_cheek", "nose"),
-            ("left_mid", "jaw_center"),
-            ("right_mid", "jaw_center"),
-            ("nose", "jaw_center"),
-            ("left_cheek", "mouth_left"),
-            ("right_cheek", "mouth_right"),
-        ]
-
-    sample_points = []
-
-    for s, e in pairs:
-        x1, y1 = points[s]
-        x2, y2 = points[e]
-        for i in range(1, 6):
-            t = i / 6
-            sample_points.append((
-                int(x1 + t * (x2 - x1)),
-                int(y1 + t * (y2 - y1))
-            ))
-
-    light, dark = [], []
-
-    for x, y in sample_points:
-        if 0 <= y < h and 0 <= x < w:
-            r, g, b = rgb_image[y, x]
-            if calculate_brightness(r, g, b) > 130:
-                light.append((r, g, b))
+        logger.info("Using male-specific landmark regions (skipping jaw)")
+
+    with stage("sampling"):
+        try:
+            if sampling == "mask":
+                pixels = sample_region_mask(rgb_image, landmarks, gender=gender)
             else:
-                dark.append((r, g, b))
+                pixels = sample_line_pairs(
+                    rgb_image,
+                    landmarks,
+                    gender=gender,
+                    density=settings.SAMPLE_DENSITY,
+                    mode=settings.SAMPLE_MODE,
+                    patch=settings.SAMPLE_PATCH,
+                )
+        except Exception as e:
+            logger.error(f"Landmark sampling failed: {e}")
+            return None, "Complex face detection error"
+
+        light, dark = split_light_dark(pixels)
 
     avg_light_rgb, avg_light_hex = compute_average_color(light)
     avg_dark_rgb, avg_dark_hex = compute_average_color(dark)
-    avg_total_rgb, avg_total_hex = compute_average_color(light + dark)
+    avg_total_rgb, avg_total_hex = compute_average_color(np.concatenate([light, dark]))
 
     # 0-10 Scale Logic (Features for the model)
     total_pixels = len(light) + len(dark)
@@ -239,10 +538,12 @@ def analyze_face_image(rgb_image: np.ndarray, gender: str = "female"):
     skin_subtype = "Light Neutral"
     
     try:
+        feature_model, feature_encoder = models.get("feature_model")
         if feature_model and feature_encoder:
             features = np.array([[r_avg, g_avg, b_avg, brightness, dark_score]], dtype=np.float32)
-            prediction = feature_model.predict(features)
-            skin_subtype_raw = feature_encoder.inverse_transform(prediction)[0]
+            with stage("feature_model"):
+                prediction = feature_model.predict(features)
+                skin_subtype_raw = feature_encoder.inverse_transform(prediction)[0]
             
             # Securely deconstruct subtype (e.g., "Light Warm")
             parts = skin_subtype_raw.split()
@@ -272,82 +573,22 @@ def analyze_face_image(rgb_image: np.ndarray, gender: str = "female"):
     
     logger.info(f"Model Prediction: {skin_subtype} (Score: {dark_score:.1f})")
 
-    recommended = seasonal_recommended_colors.get(skin_subtype, [])
-    avoid = seasonal_avoid_colors.get(skin_subtype, [])
+    palette = get_palette(skin_subtype)
+    recommended = palette.recommended
+    avoid = palette.avoid
 
+    color_model = models.get("color_model")
     if color_model:
-        # Score the 30 curated recommended colors specifically for this user
-        scored_recommended = []
-        for c in recommended:
-            try:
-                c_copy = c.copy()
-                cr, cg, cb = hex_to_rgb(c["hex"])
-                c_features = np.array([[r_avg, g_avg, b_avg, brightness, dark_score, cr, cg, cb]], dtype=np.float32)
-                pred_score = float(color_model.predict(c_features)[0])
-                c_copy["match_score"] = min(100.0, max(0.0, round(pred_score * 100, 1)))
-                scored_recommended.append(c_copy)
-            except Exception as e:
-                logger.error(f"Scoring failed for color {c.get('name')}: {e}")
-                c_copy = c.copy()
-                c_copy["match_score"] = 50.0 # Safe default
-                scored_recommended.append(c_copy)
-            
-        # Sort by ML score (highest to lowest)
-        scored_recommended.sort(key=lambda x: x.get("match_score", 0), reverse=True)
-        
-        # Return the full scored pool sorted by score instead of truncating to 8, 
-        # so the frontend has options to randomly shuffle through on 'Refresh'.
-        # We will still ensure the top 8 (which the frontend initially shows) are diverse
-        final_recommended = []
-        seen_rec_families = set()
-        
-        # Pass 1: Get the top 8 diverse
-        for c in scored_recommended:
-            family = c.get("family", "Unknown")
-            if family not in seen_rec_families:
-                final_recommended.append(c)
-                seen_rec_families.add(family)
-            if len(final_recommended) == 8:
-                break
-                
-        # Pass 2: Add all remaining colors from the pool to the end of the array
-        for c in scored_recommended:
-            if c not in final_recommended:
-                final_recommended.append(c)
-                
-        recommended = final_recommended
-        
-        # Score the avoid colors similarly
-        scored_avoid = []
-        for c in avoid:
-            c_copy = c.copy()
-            cr, cg, cb = hex_to_rgb(c["hex"])
-            c_features = np.array([[r_avg, g_avg, b_avg, brightness, dark_score, cr, cg, cb]])
-            pred_score = float(color_model.predict(c_features)[0])
-            c_copy["match_score"] = min(100.0, max(0.0, round(pred_score * 100, 1)))
-            scored_avoid.append(c_copy)
-            
-        # Lowest scores are the worst colors
-        scored_avoid.sort(key=lambda x: x.get("match_score", 0)) 
-        
-        final_avoid = []
-        seen_avoid_families = set()
-        for c in scored_avoid:
-            family = c.get("family", "Unknown")
-            if family not in seen_avoid_families and c not in recommended:
-                final_avoid.append(c)
-                seen_avoid_families.add(family)
-            if len(final_avoid) == 4:
-                break
-                
-        if len(final_avoid) < 4:
-            for c in scored_avoid:
-                if c not in recommended and c not in final_avoid:
-                    final_avoid.append(c)
-                if len(final_avoid) == 4:
-                    break
-                    
-        avoid = final_avoid
+        # Ranked palettes only depend on the subtype and the (quantized) skin features
+        skin_features = [r_avg, g_avg, b_avg, brightness, dark_score]
+        cache_key = (skin_subtype, quantize(skin_features, settings.PALETTE_CACHE_QUANTUM))
+        cached = palette_cache.get(cache_key)
+        mark("palette_cache", "miss" if cached is None else "hit")
+        if cached is not None:
+            recommended, avoid = cached
+        else:
+            recommended, avoid = rank_palette(skin_features, palette)
+            palette_cache.put(cache_key, (recommended, avoid))
 
     return {
         "skin_tone": skin_tone,
@@ -366,51 +607,379 @@ def analyze_face_image(rgb_image: np.ndarray, gender: str = "female"):
         "has_color_model": color_model is not None
     }, None
 
+def run_analysis(image_bytes, image_hash, gender, sampling=None):
+    # CPU-bound part of /analyze: runs inline or inside an executor worker process
+
+    # Same image seen before (e.g. gender toggle): reuse landmarks, skip decode + detection
+    face = None
+    if settings.LANDMARK_CACHE_ENABLED:
+        face = landmark_cache.get(image_hash)
+        mark("landmark_cache", "miss" if face is None else "hit")
+
+    if face is None:
+        detect_rgb, sample_rgb = decode_image(image_bytes)
+
+        landmarks = detect_landmarks(detect_rgb)
+        if landmarks is None:
+            return None, "No face detected"
+
+        face = (landmarks, sample_rgb)
+        if settings.LANDMARK_CACHE_ENABLED:
+            landmark_cache.put(image_hash, face)
+
+    landmarks, rgb_image = face
+    return analyze_face_image(rgb_image, gender=gender, landmarks=landmarks, sampling=sampling)
+
+def timed_analysis(image_bytes, image_hash, gender, sampling=None, timed=True):
+    # run_analysis with its stages timed. The timer is returned with the result, so stages
+    # recorded inside an executor worker process still reach the request's metrics.
+    timer = StageTimer() if timed else NULL_TIMER
+    with timer.activate(), timer.stage("analysis"):
+        result, error = run_analysis(image_bytes, image_hash, gender, sampling)
+    return result, error, timer
+
+def request_timer(capture=None, server_timing_header=True):
+    # A StageTimer when something reads the request's stages: the metrics, the Server-Timing
+    # header (batch endpoints send none) or the profile. Otherwise NULL_TIMER, so stage
+    # timing costs nothing when all of them are off.
+    if (
+        settings.METRICS_ENABLED
+        or capture is not None
+        or (server_timing_header and settings.SERVER_TIMING_ENABLED)
+    ):
+        return StageTimer()
+    return NULL_TIMER
+
+def finish_request(response, endpoint, pipeline, status_code, started, timer, capture=None):
+    # Records the request's metrics, attaches its stage timings as a Server-Timing header and
+    # writes its profile when it was profiled
+    elapsed = time.perf_counter() - started
+    if settings.METRICS_ENABLED:
+        observe_request(endpoint, pipeline, status_code, elapsed, timer)
+    if settings.SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing(timer, total=elapsed)
+        response.headers["Timing-Allow-Origin"] = TIMING_ALLOW_ORIGIN
+    if capture is not None:
+        response.headers["X-Request-ID"] = capture.request_id
+        profiler.finish(capture, pipeline, status_code, timer)
+
 # =========================
 # ROUTES
 # =========================
+@app.on_event("startup")
+def start_model_init():
+    if settings.MODEL_INIT == "background":
+        models.start_background(BACKGROUND_COMPONENTS, settings.MODEL_INIT_THREADS)
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    analysis_executor.shutdown()
+
 @app.get("/")
 def health():
     return {"message": "API running"}
 
-from outfit_router import OutfitRequest, generate_ml_outfits
+@app.get("/ready")
+def ready():
+    # Readiness for the load balancer: 503 until FaceMesh and the analysis models are loaded
+    # and warmed up, and for good if FaceMesh or the end-to-end analysis warm-up failed.
+    # Failed optional models are listed under "degraded" but do not block.
+    models.start_background(BACKGROUND_COMPONENTS, settings.MODEL_INIT_THREADS)
+    is_ready, report = models.readiness(BACKGROUND_COMPONENTS)
+    return JSONResponse(status_code=200 if is_ready else 503, content=report)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # Prometheus text format; values are for the worker process answering the scrape
+    if not settings.METRICS_ENABLED:
+        return JSONResponse(status_code=404, content={"error": "Metrics are disabled"})
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+def stats():
+    return {
+        "palette_cache": palette_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "landmark_cache": landmark_cache.stats(),
+        "executor": analysis_executor.stats(),
+        "face_mesh_pool": face_mesh_pool.stats(),
+        "score_surface": getattr(models.peek("color_score_surface"), "meta", None),
+        "models": models.states(),
+        "profiling": profiler.stats(),
+    }
+
+from outfit_router import OutfitRequest, candidate_archetypes, generate_ml_outfits
 
 @app.post("/api/outfits")
-async def get_outfits(req: OutfitRequest):
+async def get_outfits(req: OutfitRequest, request: Request, response: Response):
+    started = time.perf_counter()
+    capture = profiler.start(request.headers)
+    timer = request_timer(capture)
     try:
-        if outfit_knn_model is None or color_placement_tree is None:
-            # Fallback will be handled inside generate_ml_outfits
-            pass
-            
-        # Choose correct model based on gender
-        is_male = req.gender.lower().strip() == 'male'
-        current_knn = male_outfit_knn_model if is_male else outfit_knn_model
-        current_labels = male_outfit_knn_labels if is_male else outfit_knn_labels
-        
-        outfits = generate_ml_outfits(req, current_knn, current_labels, color_placement_tree)
+        with timer.activate():
+            # Choose correct model based on gender; each loads on its first request.
+            # Missing models are handled by the fallback inside generate_ml_outfits
+            with timer.stage("models"):
+                is_male = req.gender.lower().strip() == 'male'
+                current_knn, current_labels = await get_model(outfit_model_name("male" if is_male else "female"))
+                color_placement_tree = await get_model("color_placement_tree")
+
+            if capture is not None:
+                outfits, capture.stats = run_profiled(
+                    generate_ml_outfits, req, current_knn, current_labels, color_placement_tree
+                )
+            else:
+                outfits = generate_ml_outfits(req, current_knn, current_labels, color_placement_tree)
+        finish_request(response, "/api/outfits", "outfits", 200, started, timer, capture)
         return {"outfits": outfits}
     except Exception as e:
         logger.exception("SERVER CRASH in /api/outfits")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        error_response = JSONResponse(status_code=500, content={"error": str(e)})
+        finish_request(error_response, "/api/outfits", "outfits", 500, started, timer, capture)
+        return error_response
+
+async def analyze_upload(image_bytes, gender, sampling=None, timer=None, capture=None):
+    # Shared by /analyze and /analyze/batch: result cache, executor stage and error mapping.
+    # Returns (status_code, payload) and never raises. Stage timings go to `timer`; with a
+    # profiler `capture` the analysis runs under cProfile (inside the executor worker).
+    timer = timer or NULL_TIMER
+    sampling = sampling or settings.SAMPLING_METHOD
+    if sampling not in SAMPLING_METHODS:
+        return 400, {"error": f"Unknown sampling method '{sampling}'"}
 
-@app.post("/analyze")
-async def analyze_image(gender: str = "female", image: UploadFile = File(...)):
     try:
-        image_bytes = await image.read()
+        image_hash = None
+        if settings.RESULT_CACHE_ENABLED or settings.LANDMARK_CACHE_ENABLED:
+            with timer.stage("hash"):
+                image_hash = hashlib.sha256(image_bytes).hexdigest()
+
+        if settings.RESULT_CACHE_ENABLED:
+            cache_key = (image_hash, gender, sampling)
+            cached = result_cache.get(cache_key)
+            timer.mark("result_cache", "miss" if cached is None else "hit")
+            if cached is not None:
+                return 200, {**cached, "from_cache": True}
+
+        if analysis_executor.mode == "inline":
+            # The job runs on the event loop; make sure it will not wait there for a model load
+            for name in ANALYSIS_COMPONENTS:
+                await get_model(name)
+
+        submitted = time.perf_counter()
+        job = (timed_analysis, image_bytes, image_hash, gender, sampling, timer is not NULL_TIMER)
+        if capture is not None:
+            (result, error, analysis_timer), capture.stats = await analysis_executor.run(run_profiled, *job)
+        else:
+            result, error, analysis_timer = await analysis_executor.run(*job)
+        # Time between submitting the job and getting it back that was not spent analyzing:
+        # queueing behind other jobs, plus pickling to and from process workers
+        timer.merge(analysis_timer)
+        if "analysis" in analysis_timer.stages:
+            timer.add("executor_wait", time.perf_counter() - submitted - analysis_timer.stages["analysis"])
 
-        pil_image = Image.open(io.BytesIO(image_bytes))
-        pil_image = ImageOps.exif_transpose(pil_image)
-        pil_image = pil_image.convert("RGB")
+        if error:
+            return 400, {"error": error}
 
-        rgb_image = np.array(pil_image, dtype=np.uint8)
+        if settings.RESULT_CACHE_ENABLED:
+            result_cache.put(cache_key, result)
 
-        result, error = analyze_face_image(rgb_image, gender=gender)
+        return 200, {**result, "from_cache": False}
 
-        if error:
-            return JSONResponse(status_code=400, content={"error": error})
-
-        return result
+    except ImageRejected as e:
+        return e.status_code, {"error": str(e)}
+    except (ExecutorBusy, FaceMeshTimeout) as e:
+        return 503, {"error": str(e)}
+    except Exception as e:
+        logger.exception("SERVER CRASH")
+        return 500, {"error": str(e)}
 
+@app.post("/analyze")
+async def analyze_image(
+    request: Request,
+    response: Response,
+    gender: str = "female",
+    sampling: Optional[str] = None,
+    image: UploadFile = File(...),
+):
+    # `sampling` picks the skin sampling method ("lines" or "mask"), defaulting to SAMPLING_METHOD
+    started = time.perf_counter()
+    capture = profiler.start(request.headers)
+    timer = request_timer(capture)
+    try:
+        with timer.stage("upload"):
+            image_bytes = await image.read()
+        status_code, payload = await analyze_upload(image_bytes, gender, sampling, timer, capture)
+    except asyncio.CancelledError:
+        # Client went away; the profiler slot must still be freed
+        if capture is not None:
+            profiler.finish(capture, "analyze", None, timer)
+        raise
     except Exception as e:
         logger.exception("SERVER CRASH")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        status_code, payload = 500, {"error": str(e)}
+
+    if status_code != 200:
+        response = JSONResponse(status_code=status_code, content=payload)
+        finish_request(response, "/analyze", "analyze", status_code, started, timer, capture)
+        return response
+    finish_request(response, "/analyze", "analyze", status_code, started, timer, capture)
+    return payload
+
+def batch_gender(genders, index, default):
+    return genders[index] if index < len(genders) and genders[index] else default
+
+def batch_record(index, filename, status_code, payload, timer):
+    if settings.METRICS_ENABLED:
+        observe_stages("analyze", timer)
+
+    record = {"index": index, "filename": filename, "status": status_code}
+    if status_code == 200:
+        record["result"] = payload
+    else:
+        record["error"] = payload["error"]
+    return record
+
+async def analyze_batch_item(index, image, gender, sampling=None):
+    timer = request_timer(server_timing_header=False)
+    try:
+        with timer.stage("upload"):
+            image_bytes = await image.read()
+    except Exception as e:
+        logger.error(f"Failed to read batch image {index}: {e}")
+        status_code, payload = 400, {"error": "Could not read upload"}
+    else:
+        status_code, payload = await analyze_upload(image_bytes, gender, sampling, timer)
+    return batch_record(index, image.filename, status_code, payload, timer)
+
+async def analyze_stream_part(index, part, gender, sampling=None):
+    timer = request_timer(server_timing_header=False)
+    if part.too_large:
+        status_code, payload = 413, {"error": f"Image too large (max {settings.BATCH_STREAM_MAX_IMAGE_BYTES} bytes)"}
+    else:
+        status_code, payload = await analyze_upload(bytes(part.data), gender, sampling, timer)
+    return batch_record(index, part.filename, status_code, payload, timer)
+
+@app.post("/analyze/batch")
+async def analyze_batch(
+    gender: str = "female",
+    sampling: Optional[str] = None,
+    images: List[UploadFile] = File(...),
+    genders: List[str] = Form(default=[]),
+):
+    # Per-image gender comes from the repeated `genders` form field (by position),
+    # falling back to the `gender` query parameter
+    if len(images) > settings.BATCH_MAX_IMAGES:
+        return JSONResponse(
+            status_code=413,
+            content={"error": f"Too many images (max {settings.BATCH_MAX_IMAGES})"},
+        )
+
+    # Keep the batch within what the executor accepts, so it never trips ExecutorBusy by itself
+    semaphore = asyncio.Semaphore(max(1, settings.BATCH_CONCURRENCY))
+
+    async def run_one(index, image):
+        async with semaphore:
+            return await analyze_batch_item(
+                index, image, batch_gender(genders, index, gender), sampling
+            )
+
+    results = await asyncio.gather(*(run_one(i, image) for i, image in enumerate(images)))
+    return {"results": results}
+
+@app.post("/analyze/batch/stream")
+async def analyze_batch_stream(
+    request: Request,
+    gender: str = "female",
+    sampling: Optional[str] = None,
+):
+    # Same form fields as /analyze/batch, but the body is parsed as it arrives: each image is
+    # analyzed as soon as its part is complete, and one NDJSON record per image is sent as soon
+    # as it finishes (completion order; each record carries its input `index`). Reading the
+    # body pauses while BATCH_STREAM_IN_FLIGHT images are being analyzed, so at most that many
+    # images (plus the one being received) are held in memory, however large the batch is.
+    # A `genders` field applies to the image at its position only if it is sent before that
+    # image. Errors found after the response has started (a malformed body, too many or too
+    # large images) are reported as records with a 400 / 413 status.
+    try:
+        parts = PartStream(request.headers.get("content-type"), settings.BATCH_STREAM_MAX_IMAGE_BYTES)
+    except MultipartError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    in_flight = max(1, settings.BATCH_STREAM_IN_FLIGHT)
+
+    async def records():
+        body = request.stream()
+        received = []  # (index, part, gender) of images waiting for an analysis slot
+        pending = set()
+        genders = []
+        count = 0
+        reading = None
+        disconnect = None
+
+        def start_received():
+            while received and len(pending) < in_flight:
+                index, part, part_gender = received.pop(0)
+                pending.add(asyncio.ensure_future(analyze_stream_part(index, part, part_gender, sampling)))
+
+        try:
+            try:
+                while True:
+                    start_received()
+                    # Read on only while no complete image is waiting for a slot
+                    if reading is None and not received:
+                        reading = asyncio.ensure_future(body.__anext__())
+                    waiting = pending | {reading} if reading is not None else pending
+                    done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task is not reading:
+                            pending.discard(task)
+                            yield json.dumps(task.result()) + "\n"
+                    if reading not in done:
+                        continue
+
+                    task, reading = reading, None
+                    try:
+                        chunk = task.result()
+                    except StopAsyncIteration:
+                        break
+                    for part in parts.feed(chunk):
+                        if part.name == "genders":
+                            genders.append(part.text())
+                        elif part.name == "images":
+                            if count >= settings.BATCH_STREAM_MAX_IMAGES:
+                                raise MultipartError(
+                                    f"Too many images (max {settings.BATCH_STREAM_MAX_IMAGES})", status_code=413
+                                )
+                            received.append((count, part, batch_gender(genders, count, gender)))
+                            count += 1
+                parts.close()
+            except MultipartError as e:
+                # Stop reading; images already received still get their records
+                yield json.dumps({"index": count, "status": e.status_code, "error": str(e)}) + "\n"
+
+            # The body has been read, so receive() now only reports the client going away
+            disconnect = asyncio.ensure_future(wait_for_disconnect(request.receive))
+            while pending or received:
+                start_received()
+                done, _ = await asyncio.wait(pending | {disconnect}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    return
+                for task in done:
+                    pending.discard(task)
+                    yield json.dumps(task.result()) + "\n"
+        except ClientDisconnect:
+            pass
+        finally:
+            # Client went away (or the stream was closed): stop the work that is still running
+            for task in pending:
+                task.cancel()
+            for task in (reading, disconnect):
+                if task is not None:
+                    task.cancel()
+
+    return BodyStreamingResponse(records(), media_type="application/x-ndjson")
+
+if settings.MODEL_INIT == "eager":
+    models.load_all(threads=settings.MODEL_INIT_THREADS)
+
+logger.info(f"App module imported in {time.perf_counter() - _import_started:.2f}s (MODEL_INIT={settings.MODEL_INIT})")
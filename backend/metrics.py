@@ -0,0 +1,299 @@
+import bisect
+import contextvars
+import math
+import threading
+import time
+from types import MappingProxyType
+
+# Latency histograms and counters in the Prometheus text format, without a client library.
+# Request handlers time their stages on a StageTimer; deep helpers (decode, FaceMesh, model
+# calls) record into the timer that is active in their context through `stage(name)`, which
+# costs nothing when no timer is active. Metrics are per process: each gunicorn worker
+# reports its own, so scrape them per instance or aggregate in Prometheus.
+
+# Seconds; /analyze stages range from ~50 us (hashing) to seconds (FaceMesh on a cold graph)
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# =========================
+# STAGE TIMING
+# =========================
+class _Stage:
+    # Times one stage; usable as a context manager or started / stopped explicitly
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stop(self):
+        if self.start is not None:
+            self.timer.add(self.name, time.perf_counter() - self.start)
+            self.start = None
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def stop(self):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageTimer:
+    # Wall time per named stage of one request (repeated stages add up) and markers such as
+    # cache hits. Plain dicts only, so a timer filled in an executor worker process travels
+    # back to the request with the result.
+    def __init__(self):
+        self.stages = {}
+        self.marks = {}
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def mark(self, name, value="hit"):
+        self.marks[name] = value
+
+    def merge(self, other):
+        for name, seconds in other.stages.items():
+            self.add(name, seconds)
+        self.marks.update(other.marks)
+
+    def activate(self):
+        return _Activation(self)
+
+
+class NullTimer:
+    # Stand-in for a StageTimer nothing will read (metrics, Server-Timing and profiling all
+    # off): records nothing and activates nothing, so stage() / mark() take their no-op path
+    stages = MappingProxyType({})
+    marks = MappingProxyType({})
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def add(self, name, seconds):
+        pass
+
+    def mark(self, name, value="hit"):
+        pass
+
+    def merge(self, other):
+        pass
+
+    def activate(self):
+        return _NULL_STAGE
+
+
+NULL_TIMER = NullTimer()
+
+_current = contextvars.ContextVar("stage_timer", default=None)
+
+
+class _Activation:
+    __slots__ = ("timer", "token")
+
+    def __init__(self, timer):
+        self.timer = timer
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current.set(self.timer)
+        return self.timer
+
+    def __exit__(self, *exc):
+        _current.reset(self.token)
+
+
+def current_timer():
+    return _current.get()
+
+
+def stage(name):
+    # Context manager timing `name` on the active timer (no-op without one)
+    timer = _current.get()
+    return _NULL_STAGE if timer is None else _Stage(timer, name)
+
+
+def start_stage(name):
+    # Same, started now and ended by .stop(), for stages that do not fit a `with` block
+    return stage(name).__enter__()
+
+
+def mark(name, value="hit"):
+    timer = _current.get()
+    if timer is not None:
+        timer.mark(name, value)
+
+
+def server_timing(timer, total=None):
+    # Server-Timing header value: stage durations in ms and cache markers as descriptions,
+    # e.g. `decode;dur=4.21, face_mesh;dur=31.70, result_cache;desc=miss, total;dur=52.03`
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timer.stages.items()]
+    entries.extend(f"{name};desc={value}" for name, value in timer.marks.items())
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+# =========================
+# METRIC TYPES
+# =========================
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(counts), total) for k, (counts, total) in self._series.items())
+        for label_values, counts, total in series:
+            cumulative = 0
+            for le, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, [("le", _format_value(le))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    # Metrics in registration order, plus collectors: callables run at scrape time that return
+    # (name, type, help, [(labels dict, value), ...]) for values kept elsewhere (cache stats)
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# =========================
+# APP METRICS
+# =========================
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "skintone_stage_duration_seconds",
+    "Time spent in each stage of the analysis and outfit pipelines",
+    labels=("pipeline", "stage"),
+)
+request_seconds = registry.histogram(
+    "skintone_request_duration_seconds",
+    "Handler time of /analyze and /api/outfits requests",
+    labels=("endpoint",),
+)
+requests_total = registry.counter(
+    "skintone_requests_total",
+    "Requests by endpoint and response status",
+    labels=("endpoint", "status"),
+)
+cache_events_total = registry.counter(
+    "skintone_cache_events_total",
+    "Per-request cache outcomes (result, landmark and palette caches)",
+    labels=("cache", "outcome"),
+)
+
+
+def observe_stages(pipeline, timer):
+    for name, seconds in timer.stages.items():
+        stage_seconds.observe(seconds, pipeline, name)
+    for cache, outcome in timer.marks.items():
+        cache_events_total.inc(cache, outcome)
+
+
+def observe_request(endpoint, pipeline, status_code, seconds, timer):
+    request_seconds.observe(seconds, endpoint)
+    requests_total.inc(endpoint, str(status_code))
+    observe_stages(pipeline, timer)
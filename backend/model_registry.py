@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+STATES = ("pending", "loading", "ready", "failed")
+
+
+class Component:
+    # One lazily initialized dependency (a model, a table, a FaceMesh graph). The loader runs
+    # at most once, on first get() or from a background init thread; concurrent callers wait
+    # for the same load. A failed load keeps `default` and is not retried.
+    # `warmup(value)` runs once right after a successful load, so first-call costs (graph
+    # init, lazy buffers) are not paid inside a user request. A failed warm-up only marks the
+    # component cold. `critical` components must be ready, and warmed up if they have a
+    # warm-up, for the app to report ready.
+    def __init__(self, name, loader, default=None, warmup=None, critical=False):
+        self.name = name
+        self.loader = loader
+        self.default = default
+        self.warmup = warmup
+        self.critical = critical
+        self.value = default
+        self.state = "pending"
+        self.error = None
+        self.seconds = None
+        self.warm = False
+        self.warmup_seconds = None
+        self.warmup_error = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.state in ("ready", "failed"):
+            return self.value
+        with self._lock:
+            if self.state == "pending":
+                self._load()
+        return self.value
+
+    def _load(self):
+        self.state = "loading"
+        start = time.perf_counter()
+        try:
+            self.value = self.loader()
+            self.state = "ready"
+        except Exception as e:
+            self.value = self.default
+            self.error = str(e)
+            self.state = "failed"
+        self.seconds = time.perf_counter() - start
+
+        if self.state == "ready":
+            logger.info(f"Initialized {self.name} in {self.seconds * 1000:.0f} ms")
+            self._warm_up()
+        else:
+            logger.error(f"Failed to initialize {self.name} after {self.seconds * 1000:.0f} ms: {self.error}")
+
+    def _warm_up(self):
+        if self.warmup is None or self.value is None:
+            self.warm = True
+            return
+        start = time.perf_counter()
+        try:
+            self.warmup(self.value)
+            self.warm = True
+        except Exception as e:
+            self.warmup_error = str(e)
+        self.warmup_seconds = time.perf_counter() - start
+
+        if self.warm:
+            logger.info(f"Warmed up {self.name} in {self.warmup_seconds * 1000:.0f} ms")
+        else:
+            logger.warning(f"Warm-up of {self.name} failed after {self.warmup_seconds * 1000:.0f} ms: {self.warmup_error}")
+
+    @property
+    def settled(self):
+        # Initialized (or given up) and past its warm-up
+        return self.state == "failed" or (self.state == "ready" and (self.warm or self.warmup_error is not None))
+
+    def info(self):
+        info = {"state": self.state, "warm": self.warm, "critical": self.critical}
+        if self.seconds is not None:
+            info["init_ms"] = round(self.seconds * 1000, 1)
+        if self.warmup_seconds is not None:
+            info["warmup_ms"] = round(self.warmup_seconds * 1000, 1)
+        if self.error:
+            info["error"] = self.error
+        if self.warmup_error:
+            info["warmup_error"] = self.warmup_error
+        return info
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._components = {}
+        self._background = None
+
+    def register(self, name, loader, default=None, warmup=None, critical=False):
+        self._components[name] = Component(name, loader, default, warmup, critical)
+
+    def names(self):
+        return list(self._components)
+
+    def get(self, name):
+        return self._components[name].get()
+
+    def loaded(self, name):
+        # True once get() returns without waiting for the loader
+        return self._components[name].state in ("ready", "failed")
+
+    def peek(self, name):
+        # Value if already initialized, without triggering a load
+        component = self._components[name]
+        return component.value if component.state == "ready" else component.default
+
+    def load_all(self, names=None, threads=4):
+        # Initializes the given components (default: all) in parallel and waits for them
+        names = self.names() if names is None else list(names)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="model-init") as pool:
+            list(pool.map(self.get, names))
+        logger.info(f"Initialized {len(names)} components in {time.perf_counter() - start:.2f}s")
+
+    def start_background(self, names=None, threads=4):
+        # Same as load_all, from a daemon thread, so the app answers requests meanwhile
+        if self._background is None:
+            self._background = threading.Thread(
+                target=self.load_all, args=(names, threads), name="model-init", daemon=True
+            )
+            self._background.start()
+        return self._background
+
+    def states(self):
+        return {name: component.info() for name, component in self._components.items()}
+
+    def readiness(self, names):
+        # (ready, report): ready once every listed component has settled and every critical
+        # one initialized and warmed up. Failed non-critical components are reported as degraded.
+        components = [self._components[name] for name in names]
+        ready = all(c.settled for c in components) and all(
+            c.state == "ready" and c.warmup_error is None for c in components if c.critical
+        )
+        return ready, {
+            "ready": ready,
+            "degraded": [c.name for c in components if c.state == "failed" or c.warmup_error],
+            "components": self.states(),
+        }
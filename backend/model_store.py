@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+from score_surface import file_sha256
+from tree_eval import ARRAY_NAMES, FlatTreeEnsemble, compile_model
+
+logger = logging.getLogger(__name__)
+
+# A model store entry is one directory per model:
+#   <store>/<name>/meta.json            kind, evaluator parameters, sha256 of the source pickle
+#   <store>/<name>/<array>.npy          plain .npy buffers, memory-mapped read-only on load
+# Every process that maps the same files shares their physical pages through the page cache,
+# so gunicorn workers no longer each hold a private copy of the model.
+
+# =========================
+# PICKLES
+# =========================
+def load_pickle(path, mmap_mode="r"):
+    # joblib memory-maps the NumPy buffers of uncompressed pickles (e.g. the KNN point sets);
+    # compressed pickles are read normally
+    import joblib
+
+    return joblib.load(path, mmap_mode=mmap_mode or None)
+
+# =========================
+# FLAT TREE MODELS
+# =========================
+def _entry_dir(store_dir, name):
+    return os.path.join(store_dir, name)
+
+
+def save_flat_model(flat, store_dir, name, source_path=None):
+    entry = _entry_dir(store_dir, name)
+    os.makedirs(entry, exist_ok=True)
+
+    for array_name in ARRAY_NAMES:
+        np.save(os.path.join(entry, f"{array_name}.npy"), np.ascontiguousarray(getattr(flat, array_name)))
+    if flat.classes_ is not None:
+        # allow_pickle stays off on load, so object-dtype classes cannot be stored
+        np.save(os.path.join(entry, "classes.npy"), np.asarray(flat.classes_), allow_pickle=False)
+    if flat.init is not None:
+        np.save(os.path.join(entry, "init.npy"), np.asarray(flat.init, dtype=np.float64))
+
+    meta = {
+        "kind": "flat_trees",
+        "aggregation": flat.aggregation,
+        "max_depth": flat.max_depth,
+        "n_features": flat.n_features_in_,
+        "n_stage_outputs": flat.n_stage_outputs,
+        "n_trees": flat.n_trees,
+    }
+    if source_path:
+        meta["source"] = os.path.basename(source_path)
+        meta["source_sha256"] = file_sha256(source_path)
+    with open(os.path.join(entry, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_flat_model(store_dir, name, source_path=None, mmap_mode="r", max_batch=256):
+    # Returns None when the entry is missing or was built from a different source pickle
+    entry = _entry_dir(store_dir, name)
+    meta_path = os.path.join(entry, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("kind") != "flat_trees":
+        return None
+    if source_path and os.path.exists(source_path) and meta.get("source_sha256") != file_sha256(source_path):
+        logger.warning(f"Model store entry {name} was built from a different {os.path.basename(source_path)}, ignoring it")
+        return None
+
+    def load(array_name):
+        path = os.path.join(entry, f"{array_name}.npy")
+        return np.load(path, mmap_mode=mmap_mode or None, allow_pickle=False) if os.path.exists(path) else None
+
+    arrays = {array_name: load(array_name) for array_name in ARRAY_NAMES}
+    return FlatTreeEnsemble(
+        arrays,
+        meta["max_depth"],
+        meta["n_features"],
+        meta["aggregation"],
+        classes=load("classes"),
+        init=load("init"),
+        n_stage_outputs=meta["n_stage_outputs"],
+        max_batch=max_batch,
+    )
+
+# =========================
+# LABEL ENCODERS
+# =========================
+class StoredLabelEncoder:
+    # The part of sklearn's LabelEncoder the app uses, backed by a stored classes_ array
+    def __init__(self, classes):
+        self.classes_ = classes
+
+    def inverse_transform(self, y):
+        return self.classes_[np.asarray(y, dtype=np.intp)]
+
+
+def save_label_encoder(encoder, store_dir, name, source_path=None):
+    entry = _entry_dir(store_dir, name)
+    os.makedirs(entry, exist_ok=True)
+    classes = np.asarray(encoder.classes_)
+    if classes.dtype == object:
+        # String labels are pickled as objects; store them as a fixed-width unicode array
+        classes = classes.astype(str)
+    np.save(os.path.join(entry, "classes.npy"), classes, allow_pickle=False)
+
+    meta = {"kind": "label_encoder", "n_classes": len(encoder.classes_)}
+    if source_path:
+        meta["source"] = os.path.basename(source_path)
+        meta["source_sha256"] = file_sha256(source_path)
+    with open(os.path.join(entry, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_label_encoder(store_dir, name, source_path=None):
+    entry = _entry_dir(store_dir, name)
+    meta_path = os.path.join(entry, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("kind") != "label_encoder":
+        return None
+    if source_path and os.path.exists(source_path) and meta.get("source_sha256") != file_sha256(source_path):
+        logger.warning(f"Model store entry {name} was built from a different {os.path.basename(source_path)}, ignoring it")
+        return None
+    return StoredLabelEncoder(np.load(os.path.join(entry, "classes.npy"), allow_pickle=False))
+
+# =========================
+# LOADING
+# =========================
+def load_model(path, name, store_dir=None, mmap_mode="r", tree_eval=True, max_batch=256):
+    # Tree models come from the model store when it has a current entry (no sklearn unpickling
+    # at all); otherwise the pickle is loaded and, if enabled, flattened + parity-checked here
+    if store_dir and tree_eval:
+        try:
+            flat = load_flat_model(store_dir, name, source_path=path, mmap_mode=mmap_mode, max_batch=max_batch)
+            if flat is not None:
+                logger.info(f"{name}: loaded {flat.n_trees} trees from model store ({flat.nbytes / 1024:.0f} KB mapped)")
+                return flat
+        except Exception as e:
+            logger.warning(f"{name}: failed to load from model store: {e}")
+
+    model = load_pickle(path, mmap_mode)
+    if tree_eval:
+        model = compile_model(model, name, max_batch)
+    return model
+
+
+def load_encoder(path, name, store_dir=None, mmap_mode="r"):
+    # Label encoders from the model store skip importing sklearn just to unpickle them
+    if store_dir:
+        try:
+            encoder = load_label_encoder(store_dir, name, source_path=path)
+            if encoder is not None:
+                return encoder
+        except Exception as e:
+            logger.warning(f"{name}: failed to load from model store: {e}")
+    return load_pickle(path, mmap_mode)
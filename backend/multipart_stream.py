@@ -0,0 +1,127 @@
+try:
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from starlette.responses import StreamingResponse
+
+# Incremental multipart/form-data parsing for endpoints that start working on a part as soon as
+# it has arrived, instead of waiting for FastAPI to parse and spool the whole body. Feed request
+# body chunks to PartStream.feed(); it returns the parts those chunks completed. Only the part
+# being received is buffered, and a part's data stops being kept once it exceeds
+# `max_part_bytes` (the part is still returned, flagged `too_large`).
+
+
+class MultipartError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Part:
+    def __init__(self):
+        self.headers = []
+        self.name = ""
+        self.filename = None
+        self.content_type = None
+        self.data = bytearray()
+        self.size = 0
+        self.too_large = False
+
+    def text(self):
+        return self.data.decode("utf-8", "replace")
+
+
+class PartStream:
+    def __init__(self, content_type, max_part_bytes):
+        kind, options = parse_options_header(content_type or "")
+        if kind != b"multipart/form-data" or b"boundary" not in options:
+            raise MultipartError("Expected a multipart/form-data body")
+
+        self.max_part_bytes = max_part_bytes
+        self._part = None
+        self._header_name = b""
+        self._header_value = b""
+        self._done = []
+        self._parser = MultipartParser(options[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    def feed(self, chunk):
+        try:
+            self._parser.write(chunk)
+        except FormParserError as e:
+            raise MultipartError(f"Invalid multipart body: {e}")
+        done, self._done = self._done, []
+        return done
+
+    def close(self):
+        # Call at the end of the body; a truncated body is an error
+        try:
+            self._parser.finalize()
+        except FormParserError as e:
+            raise MultipartError(f"Invalid multipart body: {e}")
+        if self._part is not None:
+            raise MultipartError("Multipart body ended inside a part")
+
+    def _on_part_begin(self):
+        self._part = Part()
+
+    def _on_part_data(self, data, start, end):
+        part = self._part
+        part.size += end - start
+        if part.size > self.max_part_bytes:
+            if not part.too_large:
+                part.too_large = True
+                part.data = bytearray()
+            return
+        part.data += data[start:end]
+
+    def _on_part_end(self):
+        self._done.append(self._part)
+        self._part = None
+
+    def _on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._part.headers.append((self._header_name.lower(), self._header_value))
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        part = self._part
+        headers = dict(part.headers)
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise MultipartError('A part is missing the Content-Disposition "name"')
+        part.name = options[b"name"].decode("utf-8", "replace")
+        if b"filename" in options:
+            part.filename = options[b"filename"].decode("utf-8", "replace")
+        if b"content-type" in headers:
+            part.content_type = headers[b"content-type"].decode("latin-1")
+
+
+async def wait_for_disconnect(receive):
+    # Returns when the client disconnects; any unread request body is discarded
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class BodyStreamingResponse(StreamingResponse):
+    # For body iterators that read the request themselves. Starlette's StreamingResponse listens
+    # for the client disconnecting with receive(), which would take request body chunks away
+    # from the iterator; this one leaves receive() to the iterator (see wait_for_disconnect).
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
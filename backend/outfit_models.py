@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from score_surface import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# generate_ml_outfits encodes the event as 0-4 and clips formality / weather to [0, 1]
+N_EVENTS = 5
+N_NEIGHBORS = 15
+
+
+def mask_to_archetypes(mask):
+    # uint64 bit set -> ascending archetype ids
+    mask = int(mask)
+    return [i for i in range(64) if mask >> i & 1]
+
+
+class ArchetypeTable:
+    # Distinct archetypes among the N_NEIGHBORS nearest outfits of the KNN model, precomputed
+    # on a steps x steps (formality, weather) grid per event. generate_ml_outfits only uses
+    # the distinct set (it shuffles it and takes 3), so each cell is stored as a uint64 bit set.
+    def __init__(self, masks, meta=None):
+        self.masks = masks  # (N_EVENTS, steps, steps) uint64
+        self.steps = masks.shape[1]
+        self.meta = meta or {}
+
+    @property
+    def nbytes(self):
+        return self.masks.nbytes
+
+    def cell(self, formality, weather):
+        scale = self.steps - 1
+        fi = int(np.clip(np.rint(formality * scale), 0, scale))
+        wi = int(np.clip(np.rint(weather * scale), 0, scale))
+        return fi, wi
+
+    def candidates(self, event_encoded, formality, weather):
+        event = int(np.clip(event_encoded, 0, N_EVENTS - 1))
+        fi, wi = self.cell(formality, weather)
+        return mask_to_archetypes(self.masks[event, fi, wi])
+
+# =========================
+# BUILD / EVALUATE
+# =========================
+def knn_archetypes(knn_model, knn_labels, X, n_neighbors=N_NEIGHBORS):
+    # Distinct archetype bit set of the nearest neighbours of every row of X
+    _, indices = knn_model.kneighbors(X, n_neighbors=n_neighbors)
+    labels = np.asarray(knn_labels, dtype=np.int64)[indices]
+    return np.bitwise_or.reduce(np.left_shift(np.uint64(1), labels.astype(np.uint64)), axis=1)
+
+
+def build_archetype_table(knn_model, knn_labels, steps=81, n_neighbors=N_NEIGHBORS):
+    labels = np.asarray(knn_labels)
+    if labels.min() < 0 or labels.max() >= 64:
+        raise ValueError("Archetype ids must be in [0, 64) to fit the table's bit sets")
+
+    axis = np.linspace(0.0, 1.0, steps)
+    f, w = np.meshgrid(axis, axis, indexing="ij")
+    start = time.perf_counter()
+    masks = np.empty((N_EVENTS, steps, steps), dtype=np.uint64)
+    for event in range(N_EVENTS):
+        X = np.column_stack([np.full(f.size, event, dtype=np.float64), f.ravel(), w.ravel()])
+        masks[event] = knn_archetypes(knn_model, labels, X, n_neighbors).reshape(steps, steps)
+
+    logger.info(f"Built archetype table {N_EVENTS}x{steps}x{steps} in {time.perf_counter() - start:.1f}s")
+    return ArchetypeTable(masks, {"steps": steps, "n_neighbors": n_neighbors})
+
+
+def archetypes_to_mask(archetypes):
+    mask = 0
+    for a in archetypes:
+        mask |= 1 << int(a)
+    return mask
+
+
+# generate_ml_outfits' base formality per encoded event and base weather per season, before
+# it adds jitter
+EVENT_FORMALITY = (0.2, 0.8, 0.5, 0.8, 0.2)
+SEASON_WEATHER = (0.1, 0.4, 0.5, 0.9)
+
+
+def pick_frequencies(masks, picks=3):
+    # Share of picks that go to each archetype when generate_ml_outfits shuffles every candidate
+    # set and takes `picks` of it
+    freq = np.zeros(64)
+    for mask in masks:
+        ids = mask_to_archetypes(mask)
+        if ids:
+            freq[ids] += min(picks, len(ids)) / len(ids)
+    return freq / max(freq.sum(), 1e-12)
+
+
+def evaluate_model(outfit_model, knn_model, knn_labels, n_samples=1000, seed=0):
+    # Agreement of an archetype table with the KNN, at inputs drawn like
+    # generate_ml_outfits draws them (base score + jitter, clipped), n_samples per setting:
+    #   exact    share of queries answered with exactly the KNN's archetype set
+    #   jaccard  mean overlap of the two sets
+    #   pick_tv  worst total variation distance between the two models' archetype pick
+    #            frequencies over the (event, season) settings; 0 means users see the same
+    #            recommendations in the long run
+    rng = np.random.default_rng(seed)
+    exact, jaccard, pick_tv, worst = 0, 0.0, 0.0, None
+    for event in range(N_EVENTS):
+        for weather_base in SEASON_WEATHER:
+            formality = np.clip(EVENT_FORMALITY[event] + rng.normal(0, 0.15, n_samples), 0, 1)
+            weather = np.clip(weather_base + rng.normal(0, 0.2, n_samples), 0, 1)
+            X = np.column_stack([np.full(n_samples, event), formality, weather])
+
+            expected = [int(m) for m in knn_archetypes(knn_model, knn_labels, X)]
+            actual = [archetypes_to_mask(outfit_model.candidates(event, f, w)) for f, w in zip(formality, weather)]
+            for e, a in zip(expected, actual):
+                exact += e == a
+                jaccard += bin(e & a).count("1") / max(bin(e | a).count("1"), 1)
+
+            tv = 0.5 * np.abs(pick_frequencies(expected) - pick_frequencies(actual)).sum()
+            if tv >= pick_tv:
+                pick_tv, worst = float(tv), {"event": event, "weather": weather_base}
+
+    total = n_samples * N_EVENTS * len(SEASON_WEATHER)
+    return {
+        "samples": total,
+        "exact": round(exact / total, 4),
+        "jaccard": round(jaccard / total, 4),
+        "pick_tv": round(pick_tv, 4),
+        "worst_setting": worst,
+    }
+
+# =========================
+# PERSISTENCE
+# =========================
+def _save_npz(path, arrays, meta, source_paths=()):
+    meta = dict(meta)
+    meta["sources"] = {os.path.basename(p): file_sha256(p) for p in source_paths}
+    with open(path, "wb") as f:
+        np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays)
+    return meta
+
+
+def _load_npz(path, source_paths=()):
+    # Returns (arrays, meta), or None when the file is missing or was built from different
+    # model files
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path) as data:
+        arrays = {k: data[k] for k in data.files if k != "meta"}
+        meta = json.loads(str(data["meta"]))
+
+    sources = meta.get("sources", {})
+    for p in source_paths:
+        name = os.path.basename(p)
+        if name in sources and os.path.exists(p) and sources[name] != file_sha256(p):
+            logger.warning(f"{path} was built from a different {name}, ignoring it")
+            return None
+    return arrays, meta
+
+
+def save_table(table, path, source_paths=()):
+    table.meta = _save_npz(path, {"masks": table.masks}, table.meta, source_paths)
+
+
+def load_table(path, source_paths=()):
+    loaded = _load_npz(path, source_paths)
+    if loaded is None:
+        return None
+    arrays, meta = loaded
+    return ArchetypeTable(arrays["masks"], meta)
+
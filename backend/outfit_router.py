@@ -3,6 +3,8 @@ from typing import List, Optional
 import numpy as np
 import logging
 
+from metrics import stage, start_stage
+
 logger = logging.getLogger(__name__)
 
 class ColorItem(BaseModel):
@@ -78,6 +80,19 @@ NEUTRAL_MAP = {
     "Navy": "#2C3E50"
 }
 
+def candidate_archetypes(outfit_model, outfit_labels, input_features):
+    # Precomputed archetype tables (outfit_models.py) answer directly; a KNN model is queried
+    if hasattr(outfit_model, "candidates"):
+        return outfit_model.candidates(*input_features[0])
+
+    distances, indices = outfit_model.kneighbors(input_features, n_neighbors=15)
+    possible_archetypes = []
+    for idx in indices[0]:
+        arch_id = int(outfit_labels[idx])
+        if arch_id not in possible_archetypes:
+            possible_archetypes.append(arch_id)
+    return possible_archetypes
+
 def generate_ml_outfits(req: OutfitRequest, outfit_knn_model, outfit_knn_labels, color_placement_tree):
     # Determine Fit List & Normalize Gender
     is_male = req.gender.lower().strip() == 'male'
@@ -120,14 +135,9 @@ def generate_ml_outfits(req: OutfitRequest, outfit_knn_model, outfit_knn_labels,
         logger.warning("ML Models missing. Falling back to simple selection.")
         archetype_ids = [0, 1, 2] # Fallback
     else:
-        # Pull top 15 closest matching outfits from the ML model, then randomly pick 3
-        distances, indices = outfit_knn_model.kneighbors(input_features, n_neighbors=15)
-        
-        possible_archetypes = []
-        for idx in indices[0]:
-            arch_id = int(outfit_knn_labels[idx])
-            if arch_id not in possible_archetypes:
-                possible_archetypes.append(arch_id)
+        # Distinct archetypes of the 15 closest matching outfits, then randomly pick 3
+        with stage("archetypes"):
+            possible_archetypes = candidate_archetypes(outfit_knn_model, outfit_knn_labels, input_features)
                 
         np.random.shuffle(possible_archetypes)
         archetype_ids = possible_archetypes[:3]
@@ -144,7 +154,8 @@ def generate_ml_outfits(req: OutfitRequest, outfit_knn_model, outfit_knn_labels,
     skin_contrast = 0.8 if req.dark_score > 6.0 else 0.4
     
     if color_placement_tree is not None:
-        predicted_rule = int(color_placement_tree.predict([[skin_contrast, req.dark_score, is_warm]])[0])
+        with stage("placement_tree"):
+            predicted_rule = int(color_placement_tree.predict([[skin_contrast, req.dark_score, is_warm]])[0])
     else:
         predicted_rule = 0
         
@@ -179,6 +190,7 @@ def generate_ml_outfits(req: OutfitRequest, outfit_knn_model, outfit_knn_labels,
     neutrals_keys = list(NEUTRAL_MAP.keys())
     pure_basics = ["White", "Black", "Beige"]
     
+    assembly = start_stage("assembly")
     for i, arch_id in enumerate(archetype_ids):
         try:
             placement_rule = rules_to_apply[i]
@@ -325,6 +337,7 @@ def generate_ml_outfits(req: OutfitRequest, outfit_knn_model, outfit_knn_labels,
         except Exception as e:
             logger.error(f"Failed to generate outfit option {i}: {e}")
             continue
+    assembly.stop()
             
     return outfits if outfits else [{
         "outfitName": "Recovery Look",
@@ -0,0 +1,137 @@
+import hashlib
+import logging
+
+import numpy as np
+
+from color_maps import seasonal_recommended_colors, seasonal_avoid_colors
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# COLOR HELPERS
+# =========================
+def hex_to_rgb(hex_str):
+    hex_str = hex_str.lstrip('#')
+    return [int(hex_str[i:i+2], 16) for i in (0, 2, 4)]
+
+
+def rgb_to_lab(rgb):
+    # sRGB (0-255, D65) -> CIELAB, vectorized over the last axis
+    srgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+
+    xyz = linear @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+
+    eps = 216 / 24389
+    kappa = 24389 / 27
+    f = np.where(xyz > eps, np.cbrt(xyz), (kappa * xyz + 16) / 116)
+
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab.astype(np.float32)
+
+# =========================
+# COMPILED PALETTES
+# =========================
+class SubtypePalette:
+    # Recommended and avoid colors of one subtype, stored as contiguous arrays.
+    # Rows [0, n_recommended) are the recommended colors, the rest are the avoid colors.
+    def __init__(self, subtype, recommended, avoid, color_index, family_index):
+        colors = list(recommended) + list(avoid)
+        n = len(colors)
+
+        self.subtype = subtype
+        self.n_recommended = len(recommended)
+        self.rgb = np.zeros((n, 3), dtype=np.uint8)
+        self.valid = np.ones(n, dtype=bool)
+        self.family_ids = np.zeros(n, dtype=np.int32)
+        self.color_ids = np.zeros(n, dtype=np.int32)
+
+        for i, c in enumerate(colors):
+            try:
+                self.rgb[i] = hex_to_rgb(c["hex"])
+            except Exception as e:
+                logger.error(f"Invalid hex for color {c.get('name')} in {subtype}: {e}")
+                self.valid[i] = False
+
+            family = c.get("family", "Unknown")
+            self.family_ids[i] = family_index.setdefault(family, len(family_index))
+
+            key = (c.get("name"), c.get("hex"), family)
+            self.color_ids[i] = color_index.setdefault(key, len(color_index))
+
+        self.lab = rgb_to_lab(self.rgb)
+
+        # Response fragments are built once; requests only attach a match_score
+        self.fragments = tuple(dict(c) for c in colors)
+
+        # Feature template [skin features (5) + color RGB (3)] for color_model
+        self._features = np.zeros((n, 8), dtype=np.float32)
+        self._features[:, 5:] = self.rgb
+
+    def __len__(self):
+        return len(self.fragments)
+
+    @property
+    def recommended(self):
+        return list(self.fragments[:self.n_recommended])
+
+    @property
+    def avoid(self):
+        return list(self.fragments[self.n_recommended:])
+
+    def feature_matrix(self, skin_features):
+        X = self._features.copy()
+        X[:, :5] = skin_features
+        return X
+
+    def items(self, indices, scores):
+        return [{**self.fragments[i], "match_score": scores[i]} for i in indices]
+
+
+def compile_palettes(recommended_map, avoid_map):
+    color_index, family_index = {}, {}
+    palettes = {}
+    for subtype in dict.fromkeys(list(recommended_map) + list(avoid_map)):
+        palettes[subtype] = SubtypePalette(
+            subtype,
+            recommended_map.get(subtype, []),
+            avoid_map.get(subtype, []),
+            color_index,
+            family_index,
+        )
+
+    families = [None] * len(family_index)
+    for family, idx in family_index.items():
+        families[idx] = family
+    return palettes, families, list(color_index)
+
+
+def compile_catalogue(palettes, color_keys):
+    # One RGB row per stable color id, for model-wide precomputation (e.g. score surfaces)
+    rgb = np.zeros((len(color_keys), 3), dtype=np.uint8)
+    for palette in palettes.values():
+        rgb[palette.color_ids] = palette.rgb
+
+    # Changes whenever a catalogue color is added, removed, edited or renumbered
+    fingerprint = hashlib.sha256(repr(color_keys).encode()).hexdigest()[:16]
+    return rgb, fingerprint
+
+
+PALETTES, FAMILIES, COLOR_KEYS = compile_palettes(seasonal_recommended_colors, seasonal_avoid_colors)
+N_COLORS = len(COLOR_KEYS)
+CATALOGUE_RGB, CATALOGUE_FINGERPRINT = compile_catalogue(PALETTES, COLOR_KEYS)
+EMPTY_PALETTE = SubtypePalette("", [], [], {}, {})
+
+logger.info(f"Compiled {len(PALETTES)} palettes ({N_COLORS} unique colors, {len(FAMILIES)} families)")
+
+
+def get_palette(skin_subtype):
+    return PALETTES.get(skin_subtype, EMPTY_PALETTE)
@@ -0,0 +1,188 @@
+import cProfile
+import hmac
+import json
+import logging
+import marshal
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Opt-in cProfile runs of single /analyze and /api/outfits requests, for chasing tail latency
+# in production. A request is profiled when profiling is enabled and it is sampled
+# (`sample_rate`) or carries the trigger header set to `token`; without a token the header is
+# ignored, so clients cannot force profiles. At most one request per process is profiled
+# at a time; others run normally. Each profile is written to `directory` as
+#   <time>-<pipeline>-<request id>.prof   pstats data (python -m pstats, snakeviz)
+#   <time>-<pipeline>-<request id>.json   request id, status, stage timings, top functions
+# and only the newest `max_files` profiles are kept.
+#
+# The settings can be changed in a running worker through the control file, a JSON object
+# with any of "enabled", "sample_rate", "header", "token". It is re-read when its mtime
+# changes (checked every `check_interval` seconds); deleting it restores the settings.
+
+_REQUEST_ID = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def run_profiled(fn, *args):
+    # Runs fn under cProfile in the calling thread (or executor worker process) and returns
+    # (result, stats). stats is None if the profiler could not be enabled, e.g. because
+    # another profiling tool is active.
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        logger.warning(f"Profiler unavailable: {e}")
+        return fn(*args), None
+    try:
+        result = fn(*args)
+    finally:
+        profiler.disable()
+    profiler.create_stats()
+    return result, profiler.stats
+
+
+def top_functions(stats, limit=15):
+    # The `limit` functions with the most cumulative time, as readable rows
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        }
+        for (filename, line, name), (_, calls, total, cumulative, _) in rows
+    ]
+
+
+class Capture:
+    # One profiled request; the code running its work stores the stats here
+    def __init__(self, request_id, trigger):
+        self.request_id = request_id
+        self.trigger = trigger
+        self.stats = None
+
+
+class RequestProfiler:
+    def __init__(self, enabled=False, sample_rate=0.0, header="X-Profile", token="", directory="profiles",
+                 max_files=100, control_file=None, check_interval=2.0):
+        self.defaults = {"enabled": enabled, "sample_rate": sample_rate, "header": header, "token": token}
+        self.config = dict(self.defaults)
+        self.directory = directory
+        self.max_files = max(1, max_files)
+        self.control_file = control_file
+        self.check_interval = check_interval
+        self._control_mtime = None
+        self._next_check = 0.0
+        self._busy = threading.Lock()
+        self.profiled = 0
+        self.skipped = 0
+
+    def _reload(self):
+        # Re-reads the control file when it changed; keeps the last good config on errors
+        now = time.monotonic()
+        if not self.control_file or now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+
+        try:
+            mtime = os.stat(self.control_file).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._control_mtime:
+            return
+        self._control_mtime = mtime
+
+        if mtime is None:
+            self.config = dict(self.defaults)
+            logger.info(f"Profiling control file removed, using defaults: {self.config}")
+            return
+        try:
+            with open(self.control_file) as f:
+                overrides = json.load(f)
+            config = dict(self.defaults)
+            config.update({k: overrides[k] for k in self.defaults if k in overrides})
+            config["sample_rate"] = min(1.0, max(0.0, float(config["sample_rate"])))
+            self.config = config
+            logger.info(f"Profiling control file loaded: {self.config}")
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Invalid profiling control file {self.control_file}, keeping current settings: {e}")
+
+    def _trigger(self, headers):
+        config = self.config
+        header, token = config["header"], str(config["token"] or "")
+        if header and token and header in headers:
+            if hmac.compare_digest(headers[header].encode(), token.encode()):
+                return "header"
+        if config["sample_rate"] > 0 and random.random() < config["sample_rate"]:
+            return "sample"
+        return None
+
+    def start(self, headers):
+        # A Capture when this request should be profiled, otherwise None
+        self._reload()
+        if not self.config["enabled"]:
+            return None
+        trigger = self._trigger(headers)
+        if trigger is None:
+            return None
+        if not self._busy.acquire(blocking=False):
+            self.skipped += 1
+            return None
+
+        request_id = _REQUEST_ID.sub("", headers.get("x-request-id", ""))[:64] or uuid.uuid4().hex[:16]
+        return Capture(request_id, trigger)
+
+    def finish(self, capture, pipeline, status_code, timer=None):
+        # Writes the capture's profile (if it has one) and frees the slot for the next one
+        try:
+            if capture.stats is not None:
+                self._write(capture, pipeline, status_code, timer)
+                self.profiled += 1
+        except Exception as e:
+            logger.error(f"Failed to write profile {capture.request_id}: {e}")
+        finally:
+            self._busy.release()
+
+    def _write(self, capture, pipeline, status_code, timer):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{pipeline}-{capture.request_id}")
+
+        with open(base + ".prof", "wb") as f:
+            marshal.dump(capture.stats, f)
+        summary = {
+            "request_id": capture.request_id,
+            "pipeline": pipeline,
+            "trigger": capture.trigger,
+            "status": status_code,
+            "pid": os.getpid(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "stages_ms": {k: round(v * 1000, 3) for k, v in timer.stages.items()} if timer else {},
+            "marks": dict(timer.marks) if timer else {},
+            "top": top_functions(capture.stats),
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Profile of {pipeline} request {capture.request_id} written to {base}.prof")
+        self._rotate()
+
+    def _rotate(self):
+        profiles = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".prof")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in profiles[:-self.max_files]:
+            for path in (entry.path, entry.path[:-len(".prof")] + ".json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        config = {k: v for k, v in self.config.items() if k != "token"}
+        return {**config, "profiled": self.profiled, "skipped_busy": self.skipped}
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from palette import CATALOGUE_RGB, CATALOGUE_FINGERPRINT
+
+logger = logging.getLogger(__name__)
+
+# color_model only sees (r_avg, g_avg, b_avg, brightness, dark_score) from the skin, and
+# brightness is a function of r/g/b, so the surface is a 4-D grid over (r, g, b, dark_score)
+FEATURE_RANGES = ((0.0, 255.0), (0.0, 255.0), (0.0, 255.0), (0.0, 10.0))
+
+
+def _brightness(r, g, b):
+    return 0.299 * r + 0.587 * g + 0.114 * b
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ScoreSurface:
+    # Model scores for every catalogue color on a grid over skin-feature space.
+    # values: (n_r, n_g, n_b, n_dark, n_colors) float32, indexed by stable color id.
+    def __init__(self, values, ranges=FEATURE_RANGES, meta=None):
+        self.values = values
+        self.lo = np.array([lo for lo, _ in ranges], dtype=np.float64)
+        self.hi = np.array([hi for _, hi in ranges], dtype=np.float64)
+        self.shape = np.array(values.shape[:4])
+        self.meta = meta or {}
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def _grid_position(self, skin_features):
+        r, g, b, _, dark = skin_features
+        q = np.array([r, g, b, dark], dtype=np.float64)
+        t = (q - self.lo) / (self.hi - self.lo) * (self.shape - 1)
+        return np.clip(t, 0, self.shape - 1)
+
+    def lookup(self, skin_features, color_ids, interpolation="linear"):
+        t = self._grid_position(skin_features)
+
+        if interpolation == "nearest":
+            idx = tuple(np.rint(t).astype(np.intp))
+            return np.asarray(self.values[idx][color_ids], dtype=np.float64)
+
+        # Multilinear interpolation between the 16 surrounding grid points
+        i0 = np.minimum(np.floor(t).astype(np.intp), self.shape - 2)
+        f = t - i0
+        block = self.values[i0[0]:i0[0] + 2, i0[1]:i0[1] + 2, i0[2]:i0[2] + 2, i0[3]:i0[3] + 2]
+        block = np.asarray(block[..., color_ids], dtype=np.float64)
+
+        weights = np.array([1 - f[0], f[0]])
+        for d in range(1, 4):
+            weights = np.multiply.outer(weights, np.array([1 - f[d], f[d]]))
+        return np.tensordot(weights, block, axes=4)
+
+# =========================
+# BUILD / EVALUATE
+# =========================
+def build_score_surface(color_model, steps, catalogue_rgb=CATALOGUE_RGB, max_rows=500_000):
+    if len(steps) != 4 or min(steps) < 2:
+        raise ValueError("Score surface needs at least 2 grid steps for each of r, g, b, dark_score")
+
+    axes = [np.linspace(lo, hi, n) for (lo, hi), n in zip(FEATURE_RANGES, steps)]
+    grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 4)
+    skin = np.column_stack([grid[:, :3], _brightness(grid[:, 0], grid[:, 1], grid[:, 2]), grid[:, 3]])
+
+    n_colors = len(catalogue_rgb)
+    values = np.empty((len(grid), n_colors), dtype=np.float32)
+    chunk = max(1, max_rows // max(1, n_colors))
+
+    start = time.perf_counter()
+    for i in range(0, len(grid), chunk):
+        skin_chunk = skin[i:i + chunk]
+        X = np.empty((len(skin_chunk) * n_colors, 8), dtype=np.float32)
+        X[:, :5] = np.repeat(skin_chunk, n_colors, axis=0)
+        X[:, 5:] = np.tile(catalogue_rgb, (len(skin_chunk), 1))
+        values[i:i + chunk] = np.asarray(color_model.predict(X)).reshape(len(skin_chunk), n_colors)
+
+    logger.info(
+        f"Built score surface {tuple(steps)} x {n_colors} colors "
+        f"({len(grid) * n_colors} model rows) in {time.perf_counter() - start:.1f}s"
+    )
+    return ScoreSurface(values.reshape(*steps, n_colors))
+
+
+def evaluate_accuracy(surface, color_model, n_samples=200, interpolation="linear", seed=0,
+                      catalogue_rgb=CATALOGUE_RGB):
+    # Error of the surface against the live model at random skin points, in match-score
+    # points (0-100), over every catalogue color
+    rng = np.random.default_rng(seed)
+    color_ids = np.arange(len(catalogue_rgb))
+    errors = []
+    for _ in range(n_samples):
+        r, g, b = rng.uniform(0, 255, 3)
+        dark = rng.uniform(0, 10)
+        skin = [r, g, b, _brightness(r, g, b), dark]
+
+        X = np.empty((len(catalogue_rgb), 8), dtype=np.float32)
+        X[:, :5] = skin
+        X[:, 5:] = catalogue_rgb
+        live = np.asarray(color_model.predict(X), dtype=np.float64)
+        approx = surface.lookup(skin, color_ids, interpolation)
+        errors.append(np.abs(live - approx) * 100)
+
+    errors = np.concatenate(errors)
+    return {
+        "samples": n_samples,
+        "interpolation": interpolation,
+        "mae": round(float(errors.mean()), 3),
+        "p95": round(float(np.percentile(errors, 95)), 3),
+        "max": round(float(errors.max()), 3),
+    }
+
+# =========================
+# PERSISTENCE
+# =========================
+def _meta_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def save_surface(surface, path, model_path=None):
+    np.save(path, np.ascontiguousarray(surface.values))
+    meta = dict(surface.meta)
+    meta.update({
+        "steps": [int(n) for n in surface.shape],
+        "ranges": [list(r) for r in FEATURE_RANGES],
+        "catalogue": CATALOGUE_FINGERPRINT,
+    })
+    if model_path:
+        meta["model_sha256"] = file_sha256(model_path)
+    with open(_meta_path(path), "w") as f:
+        json.dump(meta, f, indent=2)
+    surface.meta = meta
+
+
+def load_surface(path, model_path=None, mmap_bytes=32 * 1024 * 1024):
+    # Returns None when the file is missing or stale (different catalogue or model)
+    if not os.path.exists(path) or not os.path.exists(_meta_path(path)):
+        return None
+
+    with open(_meta_path(path)) as f:
+        meta = json.load(f)
+
+    if meta.get("catalogue") != CATALOGUE_FINGERPRINT:
+        logger.warning("Score surface was built for a different color catalogue, ignoring it")
+        return None
+    if model_path and meta.get("model_sha256") not in (None, file_sha256(model_path)):
+        logger.warning("Score surface was built from a different color model, ignoring it")
+        return None
+
+    # Large surfaces are memory-mapped instead of read into each worker
+    mmap_mode = "r" if os.path.getsize(path) > mmap_bytes else None
+    values = np.load(path, mmap_mode=mmap_mode)
+    return ScoreSurface(values, [tuple(r) for r in meta.get("ranges", FEATURE_RANGES)], meta)
@@ -0,0 +1,79 @@
+import numpy as np
+
+SELECTION_MODES = ("family", "mmr")
+
+# =========================
+# PRIMITIVES
+# =========================
+# All functions work on arrays of palette row indices; nothing compares dicts.
+
+def order_by_score(indices, scores, descending=False):
+    # Stable sort, so equal scores keep their catalogue order
+    indices = np.asarray(indices, dtype=np.intp)
+    keys = scores[indices]
+    return indices[np.argsort(-keys if descending else keys, kind="stable")]
+
+
+def first_occurrences(order, ids):
+    # Positions in `order` holding the first row of every distinct id (ascending)
+    _, first = np.unique(ids[order], return_index=True)
+    return np.sort(first)
+
+
+def family_top_k(order, family_ids, k):
+    # First k rows of `order` with a family not seen before
+    return order[first_occurrences(order, family_ids)[:k]]
+
+
+def mmr_top_k(order, scores, lab, k, lam=0.7, delta_e_scale=100.0):
+    # Maximal marginal relevance: trades the score off against CIELAB ΔE similarity to the
+    # colors already picked. O(k * n) with a running max-similarity vector.
+    if len(order) == 0 or k <= 0:
+        return order[:0]
+    relevance = scores[order] / 100.0
+    colors = lab[order].astype(np.float64)
+    max_sim = np.zeros(len(order))
+    available = np.ones(len(order), dtype=bool)
+    picked = []
+    for _ in range(min(k, len(order))):
+        mmr = np.where(available, lam * relevance - (1 - lam) * max_sim, -np.inf)
+        best = int(np.argmax(mmr))
+        picked.append(best)
+        available[best] = False
+        delta_e = np.linalg.norm(colors - colors[best], axis=1)
+        max_sim = np.maximum(max_sim, np.clip(1 - delta_e / delta_e_scale, 0, 1))
+    return order[np.array(picked, dtype=np.intp)]
+
+
+def append_remaining(selected, order, color_ids, limit=None):
+    # selected + every other color of `order` (first row per color id, in order), up to limit
+    rest = order[first_occurrences(order, color_ids)]
+    rest = rest[~np.isin(color_ids[rest], color_ids[selected])]
+    merged = np.concatenate([selected, rest])
+    return merged if limit is None else merged[:limit]
+
+# =========================
+# PALETTE SELECTION
+# =========================
+def select_palette(palette, scores, mode="family", top_k=8, avoid_k=4, lam=0.7):
+    # Returns (recommended_rows, avoid_rows) as index arrays into the palette.
+    #   recommended: the whole pool sorted by score, with the first top_k made diverse
+    #                (family-unique, or MMR over CIELAB ΔE) so the initial view varies
+    #   avoid: the avoid_k lowest-scoring avoid colors, family-unique where possible and never
+    #          a color that is also recommended
+    scores = np.asarray(scores, dtype=np.float64)
+    n_rec = palette.n_recommended
+
+    rec_order = order_by_score(np.arange(n_rec), scores, descending=True)
+    if mode == "mmr":
+        top = mmr_top_k(rec_order, scores, palette.lab, top_k, lam)
+    else:
+        top = family_top_k(rec_order, palette.family_ids, top_k)
+    recommended = append_remaining(top, rec_order, palette.color_ids)
+
+    avoid_order = order_by_score(np.arange(n_rec, len(palette)), scores)
+    avoid_order = avoid_order[~np.isin(palette.color_ids[avoid_order], palette.color_ids[recommended])]
+    top_avoid = family_top_k(avoid_order, palette.family_ids, avoid_k)
+    avoid = append_remaining(top_avoid, avoid_order, palette.color_ids, limit=avoid_k)
+
+    return recommended, avoid
@@ -0,0 +1,255 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# ENV HELPERS
+# =========================
+def env_str(name, default):
+    return os.environ.get(name, default)
+
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid integer for {name}, using {default}")
+        return default
+
+
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid number for {name}, using {default}")
+        return default
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_floats(name, default):
+    try:
+        return tuple(float(v) for v in os.environ.get(name, default).split(","))
+    except ValueError:
+        logger.warning(f"Invalid number list for {name}, using {default}")
+        return tuple(float(v) for v in default.split(","))
+
+# =========================
+# PALETTE CACHE
+# =========================
+# Max number of (subtype, skin-feature bucket) entries kept in memory
+PALETTE_CACHE_SIZE = env_int("PALETTE_CACHE_SIZE", 2048)
+
+# Bucket width for (r_avg, g_avg, b_avg, brightness, dark_score); 0 keeps a feature exact
+PALETTE_CACHE_QUANTUM = env_floats("PALETTE_CACHE_QUANTUM", "4,4,4,4,0.5")
+
+# =========================
+# COLOR SCORE SURFACE
+# =========================
+COLOR_MODEL_PATH = env_str("COLOR_MODEL_PATH", "color_model.pkl")
+
+# Precomputed color_model scores on a (r, g, b, dark_score) grid; used instead of live
+# inference when the file exists and matches the current model + catalogue. The Docker image
+# builds it with build_score_surface.py
+SCORE_SURFACE_ENABLED = env_bool("SCORE_SURFACE_ENABLED", True)
+SCORE_SURFACE_PATH = env_str("SCORE_SURFACE_PATH", "color_score_surface.npy")
+SCORE_SURFACE_STEPS = tuple(int(n) for n in env_floats("SCORE_SURFACE_STEPS", "9,9,9,6"))
+
+# "linear" (multilinear interpolation) or "nearest" grid point
+SCORE_SURFACE_INTERPOLATION = env_str("SCORE_SURFACE_INTERPOLATION", "linear")
+
+# Build the surface at startup when no valid file exists (slow for large grids)
+SCORE_SURFACE_BUILD_ON_STARTUP = env_bool("SCORE_SURFACE_BUILD_ON_STARTUP", False)
+
+# Surfaces whose mean error vs. the live model exceeds this (score points) are not used
+SCORE_SURFACE_MAX_MAE = env_float("SCORE_SURFACE_MAX_MAE", 2.0)
+
+# Files larger than this are memory-mapped rather than loaded
+SCORE_SURFACE_MMAP_BYTES = env_int("SCORE_SURFACE_MMAP_BYTES", 32 * 1024 * 1024)
+
+# =========================
+# PALETTE SELECTION
+# =========================
+# How the first SELECTION_TOP_K recommended colors are diversified: "family" (one color per
+# family) or "mmr" (score vs. CIELAB ΔE similarity, weighted by SELECTION_MMR_LAMBDA)
+SELECTION_MODE = env_str("SELECTION_MODE", "family")
+SELECTION_TOP_K = env_int("SELECTION_TOP_K", 8)
+SELECTION_AVOID_K = env_int("SELECTION_AVOID_K", 4)
+SELECTION_MMR_LAMBDA = env_float("SELECTION_MMR_LAMBDA", 0.7)
+
+# =========================
+# RESULT CACHE
+# =========================
+# Cache full /analyze results by hash of the uploaded bytes + gender
+RESULT_CACHE_ENABLED = env_bool("RESULT_CACHE_ENABLED", True)
+RESULT_CACHE_SIZE = env_int("RESULT_CACHE_SIZE", 1024)
+RESULT_CACHE_TTL = env_float("RESULT_CACHE_TTL", 900)
+RESULT_CACHE_MAX_BYTES = env_int("RESULT_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+
+# =========================
+# LANDMARK CACHE
+# =========================
+# Cache FaceMesh landmarks + the sampling buffer by hash of the uploaded bytes, so the same
+# image can be re-sampled (e.g. for the other gender) without running detection again
+LANDMARK_CACHE_ENABLED = env_bool("LANDMARK_CACHE_ENABLED", True)
+LANDMARK_CACHE_SIZE = env_int("LANDMARK_CACHE_SIZE", 64)
+LANDMARK_CACHE_TTL = env_float("LANDMARK_CACHE_TTL", 900)
+LANDMARK_CACHE_MAX_BYTES = env_int("LANDMARK_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+
+# =========================
+# IMAGE DECODE
+# =========================
+# Uploads above either limit are rejected from the header alone, before decoding
+MAX_IMAGE_PIXELS = env_int("MAX_IMAGE_PIXELS", 50_000_000)
+MAX_IMAGE_SIDE = env_int("MAX_IMAGE_SIDE", 12000)
+
+# Longest side of the buffer FaceMesh runs on
+DETECT_MAX_SIDE = env_int("DETECT_MAX_SIDE", 640)
+
+# Longest side of the pixel buffer that skin sampling reads from
+SAMPLE_MAX_SIDE = env_int("SAMPLE_MAX_SIDE", 1024)
+
+# =========================
+# SKIN SAMPLING
+# =========================
+# Default method when a request does not pick one: "lines" samples along landmark pairs,
+# "mask" averages every pixel of the cheek/forehead(/jaw) regions, rasterized at the sample
+# buffer resolution (SAMPLE_MAX_SIDE) over the face bounding box
+SAMPLING_METHOD = env_str("SAMPLING_METHOD", "lines")
+
+# Points sampled along each landmark-pair segment
+SAMPLE_DENSITY = env_int("SAMPLE_DENSITY", 5)
+
+# How each point is read: "nearest" pixel, "bilinear" interpolation or "patch" mean
+SAMPLE_MODE = env_str("SAMPLE_MODE", "nearest")
+
+# Side of the k x k neighbourhood averaged in "patch" mode
+SAMPLE_PATCH = env_int("SAMPLE_PATCH", 3)
+
+# =========================
+# ANALYSIS EXECUTOR
+# =========================
+# "thread" runs analysis in a thread pool (sharing the FaceMesh pool below), "process" in a
+# pool of worker processes, "inline" on the event loop (which then stalls every other request
+# on the worker while an image is analyzed)
+ANALYSIS_EXECUTOR = env_str("ANALYSIS_EXECUTOR", "thread")
+ANALYSIS_WORKERS = env_int("ANALYSIS_WORKERS", 2)
+
+# Jobs allowed to wait for a free worker before /analyze answers 503
+ANALYSIS_QUEUE_DEPTH = env_int("ANALYSIS_QUEUE_DEPTH", 16)
+
+# =========================
+# FACEMESH POOL
+# =========================
+# FaceMesh graphs created lazily per process; size it to the number of analysis threads
+FACE_MESH_POOL_SIZE = env_int("FACE_MESH_POOL_SIZE", 2)
+
+# Seconds a request waits for a free FaceMesh before answering 503
+FACE_MESH_TIMEOUT = env_float("FACE_MESH_TIMEOUT", 10)
+
+# =========================
+# BATCH ANALYSIS
+# =========================
+BATCH_MAX_IMAGES = env_int("BATCH_MAX_IMAGES", 20)
+
+# Images of one batch analyzed at the same time; defaults to the executor pool size
+BATCH_CONCURRENCY = env_int("BATCH_CONCURRENCY", ANALYSIS_WORKERS)
+
+# Streaming batches (/analyze/batch/stream) may be much larger: the body is parsed as it
+# arrives and reading pauses while BATCH_STREAM_IN_FLIGHT images are analyzed, so memory is
+# bounded by (BATCH_STREAM_IN_FLIGHT + 1) * BATCH_STREAM_MAX_IMAGE_BYTES, not the batch size
+BATCH_STREAM_MAX_IMAGES = env_int("BATCH_STREAM_MAX_IMAGES", 1000)
+BATCH_STREAM_IN_FLIGHT = env_int("BATCH_STREAM_IN_FLIGHT", BATCH_CONCURRENCY)
+BATCH_STREAM_MAX_IMAGE_BYTES = env_int("BATCH_STREAM_MAX_IMAGE_BYTES", 25 * 1024 * 1024)
+
+# =========================
+# TREE EVALUATION
+# =========================
+# Evaluate the sklearn tree models (feature, color, color placement) with the flattened NumPy
+# evaluator in tree_eval.py; a model is only swapped in after exact parity with sklearn
+TREE_EVAL_ENABLED = env_bool("TREE_EVAL_ENABLED", True)
+
+# Larger batches (e.g. score surface builds) go back to sklearn's compiled predict
+TREE_EVAL_MAX_BATCH = env_int("TREE_EVAL_MAX_BATCH", 256)
+
+# =========================
+# OUTFIT MODELS
+# =========================
+# Which outfit model answers archetype queries:
+#   "table"  precomputed (event, formality, weather) lookup tables built by
+#            build_outfit_models.py; a missing or stale table falls back to the KNN
+#   "knn"    the original NearestNeighbors pickles
+OUTFIT_MODEL = env_str("OUTFIT_MODEL", "table")
+
+# A table is only used when the agreement build_outfit_models.py recorded for it keeps the
+# archetype pick frequencies within this total variation distance of the KNN's (worst event /
+# season setting); the tables measure about 0.007
+OUTFIT_MODEL_MAX_PICK_TV = env_float("OUTFIT_MODEL_MAX_PICK_TV", 0.02)
+OUTFIT_TABLE_PATH = env_str("OUTFIT_TABLE_PATH", "outfit_archetype_table.npz")
+MALE_OUTFIT_TABLE_PATH = env_str("MALE_OUTFIT_TABLE_PATH", "male_outfit_archetype_table.npz")
+
+# Grid points per axis over formality and weather (both 0-1)
+OUTFIT_TABLE_STEPS = env_int("OUTFIT_TABLE_STEPS", 81)
+
+# =========================
+# MODEL STORE
+# =========================
+# Directory written by build_model_store.py with the tree models as plain .npy buffers; they
+# are memory-mapped so every worker process shares one copy. Empty disables the store.
+MODEL_STORE_DIR = env_str("MODEL_STORE_DIR", "model_store")
+
+# mmap_mode for model buffers and joblib pickles ("r" shares pages read-only; empty loads
+# private copies)
+MODEL_MMAP_MODE = env_str("MODEL_MMAP_MODE", "r")
+
+# =========================
+# MODEL INIT
+# =========================
+# "background" loads FaceMesh and the analysis models in a thread at startup while the app
+# already answers requests, "lazy" loads each one on first use, "eager" loads everything at
+# import. Per-gender outfit models always wait for their first request unless eager.
+MODEL_INIT = env_str("MODEL_INIT", "background")
+
+# Components initialized in parallel by the background / eager init
+MODEL_INIT_THREADS = env_int("MODEL_INIT_THREADS", 4)
+
+# Run FaceMesh, every model and one end-to-end analysis on built-in fixtures right after
+# they load, so the first user request does not pay graph init / first-call costs
+WARMUP_ENABLED = env_bool("WARMUP_ENABLED", True)
+
+# =========================
+# METRICS
+# =========================
+# Per-stage latency histograms and request counters for /analyze and /api/outfits, served in
+# the Prometheus text format on /metrics (per worker process)
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+
+# Attach the per-stage timings and cache markers of /analyze and /api/outfits responses as a
+# Server-Timing header (shown in browser devtools, readable by the frontend)
+SERVER_TIMING_ENABLED = env_bool("SERVER_TIMING_ENABLED", True)
+
+# =========================
+# PROFILING
+# =========================
+# Opt-in cProfile runs of single /analyze and /api/outfits requests (see profiling.py): a
+# PROFILE_SAMPLE_RATE fraction of them, plus any request whose PROFILE_HEADER header equals
+# PROFILE_TOKEN. The header is ignored while PROFILE_TOKEN is empty. Off by default.
+PROFILE_ENABLED = env_bool("PROFILE_ENABLED", False)
+PROFILE_SAMPLE_RATE = env_float("PROFILE_SAMPLE_RATE", 0.0)
+PROFILE_HEADER = env_str("PROFILE_HEADER", "X-Profile")
+PROFILE_TOKEN = env_str("PROFILE_TOKEN", "")
+
+# Profiles are written here; only the newest PROFILE_MAX_FILES are kept
+PROFILE_DIR = env_str("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = env_int("PROFILE_MAX_FILES", 100)
+
+# JSON file overriding enabled / sample_rate / header / token in running workers, re-read when
+# its mtime changes, e.g.  echo '{"enabled": true, "sample_rate": 0.02}' > profiling.json
+PROFILE_CONTROL_FILE = env_str("PROFILE_CONTROL_FILE", "profiling.json")
+PROFILE_CONTROL_INTERVAL = env_float("PROFILE_CONTROL_INTERVAL", 2.0)
@@ -0,0 +1,223 @@
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Node arrays of a flattened ensemble; model_store.py saves and memory-maps them by name
+ARRAY_NAMES = ("feature", "threshold", "left", "right", "values", "roots")
+
+
+def flatten_trees(trees, values):
+    # Concatenated node arrays of sklearn Tree objects, with per-node output `values`
+    feature, threshold, left, right, leaf_values, roots = [], [], [], [], [], []
+    offset = 0
+    for tree, value in zip(trees, values):
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        own = np.arange(offset, offset + n)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        left.append(np.where(is_leaf, own, tree.children_left + offset))
+        right.append(np.where(is_leaf, own, tree.children_right + offset))
+        leaf_values.append(value)
+        roots.append(offset)
+        offset += n
+
+    arrays = {
+        "feature": np.concatenate(feature).astype(np.intp),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.intp),
+        "right": np.concatenate(right).astype(np.intp),
+        "values": np.concatenate(leaf_values).astype(np.float64),
+        "roots": np.array(roots, dtype=np.intp),
+    }
+    return arrays, max(tree.max_depth for tree in trees)
+
+
+class FlatTreeEnsemble:
+    # Fitted sklearn trees flattened into NumPy node arrays, evaluated with a vectorized
+    # traversal: every row walks every tree at once, one tree level per step.
+    # Leaves point to themselves, so max_depth steps always land on a leaf without branching.
+    # Batches larger than `max_batch` are handed back to the original model when there is one
+    # (arrays loaded from the model store have none) and evaluated in chunks otherwise.
+    def __init__(self, arrays, max_depth, n_features, aggregation, classes=None, init=None,
+                 n_stage_outputs=1, model=None, max_batch=256):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.aggregation = aggregation
+        self.classes_ = classes
+        self.init = init
+        self.n_stage_outputs = int(n_stage_outputs)
+        self.model = model
+        self.max_batch = max_batch
+
+    @classmethod
+    def from_trees(cls, model, trees, values, aggregation, **kwargs):
+        arrays, max_depth = flatten_trees(trees, values)
+        return cls(arrays, max_depth, model.n_features_in_, aggregation, model=model, **kwargs)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.values))
+
+    def apply(self, X):
+        # (n_rows, n_trees) leaf node ids. Same float32 cast and `<=` rule as sklearn.
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got shape {X.shape}")
+
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if len(X) > self.max_batch:
+            if self.model is not None:
+                return self.model.predict(X)
+            return np.concatenate([self.predict(X[i:i + self.max_batch])
+                                   for i in range(0, len(X), self.max_batch)])
+
+        leaf = self.values[self.apply(X)]  # (n, n_trees, k)
+
+        # Trees are accumulated left to right (cumsum) exactly like sklearn does, so results
+        # match bit for bit rather than only up to summation order
+        if self.aggregation == "single":
+            out = leaf[:, 0, :]
+        elif self.aggregation == "mean":
+            out = np.cumsum(leaf, axis=1)[:, -1, :] / self.n_trees
+        else:  # boosting: init + sum of learning_rate * leaf value, stage by stage
+            stages = leaf.reshape(len(X), -1, self.n_stage_outputs)
+            init = np.broadcast_to(self.init, (len(X), 1, self.n_stage_outputs))
+            out = np.cumsum(np.concatenate([init, stages], axis=1), axis=1)[:, -1, :]
+
+        if self.classes_ is None:
+            return out[:, 0]
+        if self.aggregation == "boosting" and self.n_stage_outputs == 1:
+            return self.classes_[(out[:, 0] >= 0).astype(int)]
+        return self.classes_[np.argmax(out, axis=1)]
+
+# =========================
+# CONVERSION
+# =========================
+def _tree_classifier_values(tree):
+    # Normalized class distribution per node, as sklearn's predict_proba computes it
+    value = tree.value[:, 0, :].astype(np.float64)
+    normalizer = value.sum(axis=1, keepdims=True)
+    normalizer[normalizer == 0.0] = 1.0
+    return value / normalizer
+
+
+def flatten_model(model, max_batch=256):
+    # Returns a FlatTreeEnsemble for supported sklearn models, or None
+    from sklearn.ensemble import (
+        ExtraTreesClassifier,
+        ExtraTreesRegressor,
+        GradientBoostingClassifier,
+        GradientBoostingRegressor,
+        RandomForestClassifier,
+        RandomForestRegressor,
+    )
+    from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+    if getattr(model, "n_outputs_", 1) != 1:
+        return None
+
+    if isinstance(model, DecisionTreeClassifier):
+        tree = model.tree_
+        return FlatTreeEnsemble.from_trees(model, [tree], [_tree_classifier_values(tree)], "single",
+                                           classes=model.classes_, max_batch=max_batch)
+
+    if isinstance(model, DecisionTreeRegressor):
+        tree = model.tree_
+        return FlatTreeEnsemble.from_trees(model, [tree], [tree.value[:, 0, :]], "single",
+                                           max_batch=max_batch)
+
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+        trees = [est.tree_ for est in model.estimators_]
+        return FlatTreeEnsemble.from_trees(model, trees, [_tree_classifier_values(t) for t in trees],
+                                           "mean", classes=model.classes_, max_batch=max_batch)
+
+    if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+        trees = [est.tree_ for est in model.estimators_]
+        return FlatTreeEnsemble.from_trees(model, trees, [t.value[:, 0, :] for t in trees], "mean",
+                                           max_batch=max_batch)
+
+    if isinstance(model, (GradientBoostingClassifier, GradientBoostingRegressor)):
+        # estimators_ is (n_stages, K); flatten stage-major so leaves reshape to (n, stages, K)
+        stages, k = model.estimators_.shape
+        trees = [model.estimators_[s, j].tree_ for s in range(stages) for j in range(k)]
+        values = [model.learning_rate * t.value[:, 0, :] for t in trees]
+        # Only a constant init estimator (the default) can be folded in; parity catches the rest
+        init = model._raw_predict_init(np.zeros((1, model.n_features_in_), dtype=np.float32))[0]
+        classes = model.classes_ if isinstance(model, GradientBoostingClassifier) else None
+        return FlatTreeEnsemble.from_trees(model, trees, values, "boosting", classes=classes,
+                                           init=init, n_stage_outputs=k, max_batch=max_batch)
+
+    return None
+
+
+def parity_inputs(flat, n_rows=2000, seed=0):
+    # Rows that land on both sides of the trees' thresholds, plus uniform noise around them
+    rng = np.random.default_rng(seed)
+    X = np.empty((n_rows, flat.n_features_in_), dtype=np.float32)
+    internal = flat.left != np.arange(len(flat.left))
+    for f in range(flat.n_features_in_):
+        thresholds = flat.threshold[internal & (flat.feature == f)]
+        if len(thresholds) == 0:
+            X[:, f] = rng.uniform(-1, 1, n_rows)
+            continue
+        candidates = np.concatenate([
+            thresholds,
+            np.nextafter(thresholds.astype(np.float32), np.float32(np.inf)),
+            rng.uniform(thresholds.min() - 1, thresholds.max() + 1, len(thresholds)),
+        ])
+        X[:, f] = rng.choice(candidates, n_rows)
+    return X
+
+
+def compile_model(model, name="model", max_batch=256, n_checks=2000):
+    # Flattens `model` and checks it predicts exactly like sklearn on threshold-straddling
+    # inputs. Returns the flat evaluator, or the untouched model if unsupported or not identical.
+    if model is None:
+        return None
+    try:
+        flat = flatten_model(model, max_batch=max_batch)
+        if flat is None:
+            logger.info(f"{name}: {type(model).__name__} not supported by the tree evaluator")
+            return model
+
+        X = parity_inputs(flat, n_checks)
+        start = time.perf_counter()
+        expected = model.predict(X)
+        sklearn_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = np.concatenate([flat.predict(X[i:i + max_batch]) for i in range(0, len(X), max_batch)])
+        flat_time = time.perf_counter() - start
+
+        if not np.array_equal(actual, expected):
+            mismatches = int(np.sum(actual != expected))
+            logger.warning(f"{name}: tree evaluator differs from sklearn on {mismatches}/{len(X)} rows, not used")
+            return model
+    except Exception as e:
+        logger.warning(f"{name}: tree evaluator unavailable ({e})")
+        return model
+
+    logger.info(
+        f"{name}: compiled {flat.n_trees} trees ({flat.nbytes / 1024:.0f} KB), exact parity on "
+        f"{len(X)} rows (sklearn {sklearn_time * 1000:.1f} ms, flat {flat_time * 1000:.1f} ms)"
+    )
+    return flat